@@ -1,47 +1,43 @@
 import os
+import time
 import zipfile
-import math
-from collections import Counter
-from io import BytesIO
-from xml.etree import ElementTree
+import multiprocessing
+from multiprocessing.connection import wait
 import olefile
+from utils import worker_count
+from docx_format import iter_docx_text
+from entropy_features import byte_histogram, file_histogram, entropy_from_histogram
+from instrumentation import stage
+
+FILE_TIMEOUT = 120  # seconds allowed per file before it is reported as timed out
+MAX_TEXT_CHARS = None  # stop extracting document text after this many characters (None = all)
 
 def calculate_entropy(data):
     if not data:
         return 0
-    counter = Counter(data)
-    total = len(data)
-    return -sum((count / total) * math.log2(count / total) for count in counter.values())
+    return entropy_from_histogram(byte_histogram(data))
+
+def _docx_text(zf):
+    return " ".join(iter_docx_text(zf, MAX_TEXT_CHARS))
+
+def _docx_images(names):
+    return [os.path.basename(name) for name in names if name.startswith("word/media/")]
 
 def extract_docx_text(path):
     try:
-        with open(path, 'rb') as f:
-            data = f.read()
-        with zipfile.ZipFile(BytesIO(data)) as zf:
+        with zipfile.ZipFile(path) as zf:
             if "word/document.xml" not in zf.namelist():
                 return "[Error]: No document.xml found"
-            xml_data = zf.read("word/document.xml")
-            tree = ElementTree.fromstring(xml_data)
-            paragraphs = tree.findall(
-                './/w:t',
-                namespaces={'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'}
-            )
-            return " ".join([p.text for p in paragraphs if p.text])
+            return _docx_text(zf)
     except Exception as e:
         return f"[Error]: {e}"
 
 def extract_docx_images(path):
-    images = []
     try:
-        with open(path, 'rb') as f:
-            data = f.read()
-        with zipfile.ZipFile(BytesIO(data)) as zf:
-            for name in zf.namelist():
-                if name.startswith("word/media/"):
-                    images.append(os.path.basename(name))
+        with zipfile.ZipFile(path) as zf:
+            return _docx_images(zf.namelist())
     except Exception as e:
-        images.append(f"[Error]: {e}")
-    return images
+        return [f"[Error]: {e}"]
 
 def analyze_docx(path):
     result = {
@@ -53,16 +49,18 @@ def analyze_docx(path):
         "images": []
     }
     try:
-        with open(path, 'rb') as f:
-            data = f.read()
-        with zipfile.ZipFile(BytesIO(data)) as zf:
+        # one read of the central directory serves every field
+        with zipfile.ZipFile(path) as zf:
             result["valid_zip"] = True
             names = zf.namelist()
             result["has_document_xml"] = "word/document.xml" in names
             result["encrypted"] = "EncryptedPackage" in names
             if result["has_document_xml"] and not result["encrypted"]:
-                result["extracted_text"] = extract_docx_text(path)
-            result["images"] = extract_docx_images(path)
+                try:
+                    result["extracted_text"] = _docx_text(zf)
+                except Exception as e:
+                    result["extracted_text"] = f"[Error]: {e}"
+            result["images"] = _docx_images(names)
     except Exception as e:
         result["error"] = str(e)
     return result
@@ -95,25 +93,126 @@ def analyze_enc_file(path):
         "encrypted": False
     }
     try:
-        with open(path, "rb") as f:
-            data = f.read()
-        result["size"] = len(data)
-        result["entropy"] = round(calculate_entropy(data), 4)
+        # histogram streamed in BLOCK_SIZE reads, never the whole file in memory
+        hist = file_histogram(path)
+        result["size"] = int(hist.sum())
+        result["entropy"] = round(entropy_from_histogram(hist), 4)
         result["encrypted"] = result["entropy"] > 5.0
     except Exception as e:
         result["error"] = str(e)
     return result
 
-def analyze_files(file_paths):
-    report = {}
-    for path in file_paths:
-        filename = os.path.basename(path)
-        if path.endswith(".docx"):
-            report[filename] = analyze_docx(path)
-        elif path.endswith(".doc"):
-            report[filename] = analyze_doc(path)
-        elif path.endswith(".enc") or path.endswith(".bin"):
-            report[filename] = analyze_enc_file(path)
-        else:
-            report[filename] = {"error": "Unsupported format"}
-    return report
+def analyze_file(path):
+    if path.endswith(".docx"):
+        return analyze_docx(path)
+    elif path.endswith(".doc"):
+        return analyze_doc(path)
+    elif path.endswith(".enc") or path.endswith(".bin"):
+        return analyze_enc_file(path)
+    return {"error": "Unsupported format"}
+
+def _analysis_worker(conn):
+    # one file at a time, so a file that hangs only ever blocks its own worker
+    while True:
+        path = conn.recv()
+        if path is None:
+            return
+        try:
+            result = analyze_file(path)
+        except Exception as e:
+            result = {"error": str(e)}
+        conn.send(result)
+
+def _start_worker():
+    parent_conn, child_conn = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=_analysis_worker, args=(child_conn,), daemon=True)
+    process.start()
+    child_conn.close()
+    return {"process": process, "conn": parent_conn, "task": None, "started": None}
+
+def _stop_worker(worker):
+    worker["process"].terminate()
+    worker["process"].join()
+    worker["conn"].close()
+
+def _iter_results(file_paths, num_workers, timeout):
+    """
+    Yield (path, result, timed_out) in input order. Each file's clock starts
+    when a worker picks it up; a worker still busy after `timeout` seconds is
+    killed and replaced, and only its own file is reported as timed out.
+    """
+    if timeout is None and num_workers <= 1:
+        for path in file_paths:
+            yield path, analyze_file(path), False
+        return
+
+    queued = iter(enumerate(file_paths))
+    results = {}
+    next_index = 0
+    workers = [_start_worker() for _ in range(max(1, num_workers))]
+    try:
+        while next_index < len(file_paths):
+            for worker in workers:
+                if worker["task"] is None:
+                    task = next(queued, None)
+                    if task is not None:
+                        worker["task"], worker["started"] = task[0], time.monotonic()
+                        worker["conn"].send(task[1])
+
+            busy = [w for w in workers if w["task"] is not None]
+            wait_for = None
+            if timeout is not None:
+                wait_for = max(0, min(w["started"] + timeout for w in busy) - time.monotonic())
+            ready = wait([w["conn"] for w in busy], wait_for)
+
+            for i, worker in enumerate(workers):
+                if worker["task"] is None:
+                    continue
+                if worker["conn"] in ready:
+                    try:
+                        results[worker["task"]] = (worker["conn"].recv(), False)
+                        worker["task"] = None
+                        continue
+                    except EOFError:
+                        # the worker died (e.g. a crash in a parser's C code): replace it
+                        results[worker["task"]] = ({"error": "Analysis worker exited unexpectedly"}, False)
+                elif timeout is not None and time.monotonic() - worker["started"] >= timeout:
+                    results[worker["task"]] = ({"error": f"Analysis timed out after {timeout}s"}, True)
+                else:
+                    continue
+                _stop_worker(worker)
+                workers[i] = _start_worker()
+
+            while next_index in results:
+                result, timed_out = results.pop(next_index)
+                yield file_paths[next_index], result, timed_out
+                next_index += 1
+    finally:
+        for worker in workers:
+            _stop_worker(worker)
+
+def iter_analyze_files(file_paths, num_workers=None, timeout=FILE_TIMEOUT, progress=None):
+    """
+    Analyze files over worker processes, yielding (filename, result) in input order.
+    A file still running `timeout` seconds after its worker picked it up is
+    reported with an error, and that worker is killed and replaced at once.
+    `progress`, if given, is called with files_analyzed/total_files per file.
+    """
+    file_paths = list(file_paths)
+    num_workers = max(1, min(num_workers or worker_count(), len(file_paths)))
+    with stage("analyze", files=len(file_paths), workers=num_workers) as st:
+        results = _iter_results(file_paths, num_workers, timeout)
+        for i, (path, result, timed_out) in enumerate(results, start=1):
+            st.add_bytes(os.path.getsize(path) if os.path.exists(path) else 0)
+            if timed_out:
+                st.reject("timeout")
+            elif "error" in result:
+                st.reject("error")
+            else:
+                st.accept()
+            if progress:
+                progress(files_analyzed=i, total_files=len(file_paths))
+            yield os.path.basename(path), result
+
+def analyze_files(file_paths, num_workers=None, timeout=FILE_TIMEOUT, progress=None):
+    return dict(iter_analyze_files(file_paths, num_workers, timeout, progress))
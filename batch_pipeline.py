@@ -0,0 +1,224 @@
+# batch_pipeline.py — headless scan -> recover -> analyze -> images -> ML over many dumps
+#
+#   python batch_pipeline.py case1.001 case2.bin --out cases --workers 8 --jobs 2
+#   python batch_pipeline.py --list queue.txt --out cases --skip-ml
+#
+# Every dump gets its own case directory (fragments, recovered documents,
+# images, report, dedup store, prediction cache, metrics and summary), so
+# cases never share state and can run side by side. Up to --jobs cases run
+# at once, each in its own process, and the --workers budget is split
+# between them.
+
+import os
+import sys
+import json
+import time
+import argparse
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from utils import worker_count
+from slot_scanner import scan_and_create_accurate_fragment, MANIFEST_FILE, OUTPUT_FOLDER
+from slot_recovery import recover_docx_parallel, OUTPUT_DIR
+from dedup_store import DEDUP_DB
+from analysis import iter_analyze_files
+from prediction_cache import PREDICTION_CACHE
+from report_store import REPORT_FILE, JSON_EXPORT, reset_report, append_records, export_json
+from slot_image_recovery import extract_images_from_all_docx
+from entropy_map import MAP_FILE, build_entropy_map, high_entropy_regions
+from checkpoint import CHECKPOINT_DIR, checkpoint_path
+from instrumentation import METRICS_FILE, JsonMetricsSink, add_sink, remove_sink
+
+CASES_DIR = "cases"
+SUMMARY_FILE = "summary.json"
+BATCH_SUMMARY_FILE = "batch_summary.json"
+IMAGES_DIR = "recovered_images"
+
+def case_paths(case_dir):
+    """Every file a case reads or writes, all inside its own directory."""
+    return {
+        "fragments": os.path.join(case_dir, OUTPUT_FOLDER),
+        "manifest": os.path.join(case_dir, MANIFEST_FILE),
+        "recovered": os.path.join(case_dir, OUTPUT_DIR),
+        "dedup": os.path.join(case_dir, DEDUP_DB),
+        "predictions": os.path.join(case_dir, PREDICTION_CACHE),
+        "report": os.path.join(case_dir, REPORT_FILE),
+        "report_json": os.path.join(case_dir, JSON_EXPORT),
+        "images": os.path.join(case_dir, IMAGES_DIR),
+        "entropy_map": os.path.join(case_dir, MAP_FILE),
+        "metrics": os.path.join(case_dir, METRICS_FILE),
+        "summary": os.path.join(case_dir, SUMMARY_FILE),
+        "checkpoints": os.path.join(case_dir, CHECKPOINT_DIR),
+    }
+
+def _case_dirs(dump_paths, out_dir):
+    # one directory per dump, named after it; repeated names get a numeric suffix
+    dirs, used = [], set()
+    for dump_path in dump_paths:
+        name = os.path.splitext(os.path.basename(dump_path))[0] or "case"
+        candidate, n = name, 1
+        while candidate in used:
+            n += 1
+            candidate = f"{name}_{n}"
+        used.add(candidate)
+        dirs.append(os.path.join(out_dir, candidate))
+    return dirs
+
+def run_case(dump_path, case_dir, num_workers=1, skip_ml=False, entropy=False, copy_fragments=False):
+    """
+    Run the whole pipeline for one dump inside `case_dir` and return its summary.
+    A failing stage stops the case; the summary records which one and why.
+    """
+    paths = case_paths(case_dir)
+    os.makedirs(case_dir, exist_ok=True)
+    name = os.path.basename(case_dir)
+    summary = {"dump": os.path.abspath(dump_path), "case_dir": os.path.abspath(case_dir),
+               "workers": num_workers, "stages": {}, "status": "ok"}
+
+    def stage(stage_name, func):
+        print(f"[i] [{name}] {stage_name}...")
+        started = time.perf_counter()
+        result = func()
+        summary["stages"][stage_name] = {"seconds": round(time.perf_counter() - started, 2), **(result or {})}
+        print(f"[✓] [{name}] {stage_name} done: {summary['stages'][stage_name]}")
+
+    def scan():
+        found, slots = scan_and_create_accurate_fragment(
+            dump_path, manifest_only=not copy_fragments,
+            output_folder=paths["fragments"], num_workers=num_workers)
+        return {"fragments": found, "scanned_slots": slots}
+
+    def recover():
+        if copy_fragments:
+            sources = sorted(os.path.join(paths["fragments"], f) for f in os.listdir(paths["fragments"])
+                             if f.startswith("fragment_part") and f.endswith(".bin"))
+        else:
+            sources = [paths["manifest"]] if os.path.exists(paths["manifest"]) else []
+        resume_from = checkpoint_path("recover", sources, paths["checkpoints"])
+        recovered = recover_docx_parallel(sources, paths["recovered"], dedup_path=paths["dedup"],
+                                          num_workers=num_workers, checkpoint_path=resume_from) if sources else []
+        return {"recovered": len(recovered)}
+
+    def analyze():
+        os.makedirs(paths["recovered"], exist_ok=True)
+        files = sorted(os.path.join(paths["recovered"], f) for f in os.listdir(paths["recovered"])
+                       if f.endswith(".docx") or f.endswith(".doc"))
+        reset_report(paths["report"])
+        append_records(iter_analyze_files(files, num_workers), paths["report"])
+        return {"analyzed": len(files)}
+
+    def images():
+        extract_images_from_all_docx(paths["recovered"], paths["images"])
+        count = len(os.listdir(paths["images"])) if os.path.exists(paths["images"]) else 0
+        return {"images": count}
+
+    def classify():
+        # imported here so cases run with --skip-ml never need the ML stack
+        from gui_logic import run_ml_classification
+        predictions = run_ml_classification(paths["report"], n_jobs=num_workers, cache_path=paths["predictions"])
+        export_json(paths["report"], paths["report_json"])
+        encrypted = sum(p["ml_encryption"] == "Encrypted" for p in predictions.values())
+        return {"classified": len(predictions), "encrypted": encrypted}
+
+    def entropy_map():
+        regions = high_entropy_regions(build_entropy_map(dump_path, paths["entropy_map"], num_workers=num_workers))
+        return {"high_entropy_regions": len(regions)}
+
+    def export():
+        return {"report": export_json(paths["report"], paths["report_json"])}
+
+    # the report is exported before ML, so a failing ML stage still leaves a usable report
+    stages = [("scan", scan), ("recover", recover), ("analyze", analyze), ("images", images), ("export", export)]
+    if entropy:
+        stages.append(("entropy_map", entropy_map))
+    if not skip_ml:
+        stages.append(("ml", classify))
+
+    started = time.perf_counter()
+    sink = add_sink(JsonMetricsSink(paths["metrics"]))
+    try:
+        for stage_name, func in stages:
+            stage(stage_name, func)
+    except Exception as e:
+        summary["status"] = "failed"
+        summary["failed_stage"] = stage_name
+        summary["error"] = f"{type(e).__name__}: {e}"
+        summary["traceback"] = traceback.format_exc()
+        print(f"[!] [{name}] {stage_name} failed: {e}")
+    finally:
+        remove_sink(sink)
+    summary["seconds"] = round(time.perf_counter() - started, 2)
+
+    with open(paths["summary"], "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+def _run_case_task(args):
+    return run_case(*args)
+
+def run_batch(dump_paths, out_dir=CASES_DIR, workers=None, jobs=1, skip_ml=False, entropy=False,
+              copy_fragments=False):
+    """
+    Process every dump into its own case directory under `out_dir`.
+    At most `jobs` cases run concurrently and they share a budget of
+    `workers` processes (default: 70% of the cores).
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    workers = workers or worker_count()
+    jobs = max(1, min(jobs, len(dump_paths), workers))
+    per_case = max(1, workers // jobs)
+    tasks = [
+        (dump_path, case_dir, per_case, skip_ml, entropy, copy_fragments)
+        for dump_path, case_dir in zip(dump_paths, _case_dirs(dump_paths, out_dir))
+    ]
+    print(f"[✓] {len(tasks)} case(s), {jobs} at a time, {per_case} worker(s) each")
+
+    if jobs == 1:
+        summaries = [_run_case_task(task) for task in tasks]
+    else:
+        # one process per case: a crash or leak in one case cannot take down the others
+        summaries = [None] * len(tasks)
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = {executor.submit(_run_case_task, task): i for i, task in enumerate(tasks)}
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    summaries[i] = future.result()
+                except Exception as e:
+                    summaries[i] = {"dump": os.path.abspath(tasks[i][0]), "case_dir": os.path.abspath(tasks[i][1]),
+                                    "status": "failed", "error": f"{type(e).__name__}: {e}"}
+
+    with open(os.path.join(out_dir, BATCH_SUMMARY_FILE), "w", encoding="utf-8") as f:
+        json.dump(summaries, f, indent=2)
+    return summaries
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the ForenDOC pipeline headless over a list of dumps.")
+    parser.add_argument("dumps", nargs="*", help="dump files to process")
+    parser.add_argument("--list", help="text file with one dump path per line")
+    parser.add_argument("--out", default=CASES_DIR, help="directory that receives one folder per case")
+    parser.add_argument("--workers", type=int, default=None, help="total worker processes shared by all cases")
+    parser.add_argument("--jobs", type=int, default=1, help="cases processed at the same time")
+    parser.add_argument("--skip-ml", action="store_true", help="do not run ML classification")
+    parser.add_argument("--entropy-map", action="store_true", help="also build the dump's entropy map")
+    parser.add_argument("--copy-fragments", action="store_true",
+                        help="write fragment_partN.bin copies instead of a zero-copy manifest")
+    args = parser.parse_args()
+
+    dumps = list(args.dumps)
+    if args.list:
+        with open(args.list, "r", encoding="utf-8") as f:
+            dumps += [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    missing = [d for d in dumps if not os.path.isfile(d)]
+    if not dumps or missing:
+        parser.error(f"missing dump file(s): {', '.join(missing)}" if missing else "no dumps given")
+
+    summaries = run_batch(dumps, args.out, args.workers, args.jobs, args.skip_ml, args.entropy_map,
+                          args.copy_fragments)
+    failed = [s for s in summaries if s["status"] != "ok"]
+    for s in summaries:
+        mark = "[✓]" if s["status"] == "ok" else "[!]"
+        print(f"{mark} {os.path.basename(s['dump'])}: {s['status']} -> {s['case_dir']}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
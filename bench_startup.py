@@ -0,0 +1,62 @@
+# bench_startup.py — measure GUI import time and time-to-window
+
+import os
+import sys
+import json
+import subprocess
+
+# Runs in a fresh interpreter: times `import gui`, then replaces Tk.mainloop
+# so the window is drawn once and closed, giving the time-to-window.
+PROBE = r"""
+import json, os, sys, time
+t0 = time.perf_counter()
+import tkinter as tk
+result = {}
+
+def _mainloop(self, n=0):
+    self.update()
+    result["time_to_window"] = time.perf_counter() - t0
+    self.destroy()
+
+tk.Tk.mainloop = _mainloop
+import gui
+import gui_logic
+result["import_gui"] = time.perf_counter() - t0
+result["models_loaded"] = gui_logic.get_model.cache_info().currsize
+result["heavy_modules"] = [m for m in ("joblib", "sklearn", "matplotlib", "wordcloud") if m in sys.modules]
+if os.environ.get("DISPLAY") or sys.platform in ("win32", "darwin"):
+    gui.launch_gui()
+print(json.dumps(result))
+"""
+
+def measure_startup(runs=5):
+    """Return per-run startup measurements, each from a fresh interpreter."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", PROBE], cwd=here,
+                             capture_output=True, text=True, check=True)
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return results
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    results = measure_startup(runs)
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name in ("rf_encryption_model.pkl", "ensemble_classifier.pkl"):
+        path = os.path.join(here, name)
+        if os.path.exists(path):
+            print(f"[i] {name}: {os.path.getsize(path) / 1024:.1f} KB (not loaded at startup)")
+
+    imports = sorted(r["import_gui"] for r in results)
+    print(f"[✓] import gui: median {imports[len(imports) // 2] * 1000:.1f} ms over {runs} runs")
+    windows = sorted(r["time_to_window"] for r in results if "time_to_window" in r)
+    if windows:
+        print(f"[✓] time to window: median {windows[len(windows) // 2] * 1000:.1f} ms")
+    else:
+        print("[!] No display available, time to window not measured.")
+    if any(r["models_loaded"] or r["heavy_modules"] for r in results):
+        print(f"[!] Startup pulled in models or heavy modules: {results[0]['heavy_modules']}")
+
+if __name__ == "__main__":
+    main()
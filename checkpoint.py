@@ -0,0 +1,129 @@
+# checkpoint.py — resumable journals for long scans and recoveries
+#
+# A stage appends one JSON line per finished unit of work (a scanned byte
+# range, a written document, ...) to its journal. The first line stamps the
+# journal with a fingerprint of every source and the stage's parameters; a
+# restarted run with the same stamp replays the journal and skips what is
+# already done, while any other stamp discards it and starts from scratch.
+
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+from utils import BLOCK_SIZE
+
+CHECKPOINT_DIR = "checkpoints"
+FINGERPRINT_SAMPLES = 64  # blocks hashed per source
+FINGERPRINT_BLOCK = 64 * 1024  # 64 KB per sampled block
+
+def source_fingerprint(path, samples=FINGERPRINT_SAMPLES, block=FINGERPRINT_BLOCK):
+    """
+    SHA-1 of the file size and `samples` evenly spaced blocks (the whole file
+    when it is small). Costs a few MB of reads even on multi-terabyte images,
+    yet changes if the source is truncated, re-imaged or swapped.
+    """
+    size = os.path.getsize(path)
+    digest = hashlib.sha1(str(size).encode("ascii"))
+    with open(path, "rb") as f:
+        if size <= samples * block:
+            for chunk in iter(lambda: f.read(BLOCK_SIZE), b""):
+                digest.update(chunk)
+        else:
+            step = (size - block) // (samples - 1)
+            for i in range(samples):
+                f.seek(i * step)
+                digest.update(f.read(block))
+    return digest.hexdigest()
+
+def checkpoint_path(stage, sources, directory=CHECKPOINT_DIR):
+    """Journal path for `stage` over `sources`, distinct per set of sources."""
+    key = hashlib.sha1("\n".join(sorted(os.path.abspath(p) for p in sources)).encode("utf-8"))
+    return os.path.join(directory, f"{stage}_{key.hexdigest()[:12]}.jsonl")
+
+class Checkpoint:
+    """
+    Append-only journal of the work a stage has finished.
+    Large results (e.g. offset arrays) go to .npz files in a side directory
+    and are written before the journal line that refers to them, so a
+    recorded unit of work is always complete on disk.
+    """
+
+    def __init__(self, path, sources, params=None):
+        self.path = path
+        self.data_dir = path + ".d"
+        # round-trip through JSON so tuples and lists compare equal on reload
+        self.stamp = json.loads(json.dumps({
+            "sources": {os.path.abspath(p): source_fingerprint(p) for p in sources},
+            "params": params or {},
+        }))
+        self.records = []
+        self.resumed = self._load()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # rewrite header and valid records, dropping a line torn by a crash
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in [self.stamp] + self.records:
+                f.write(json.dumps(record) + "\n")
+        os.replace(tmp_path, path)
+        self.file = open(path, "a", encoding="utf-8")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        try:
+            header = json.loads(lines[0]) if lines else None
+        except json.JSONDecodeError:
+            header = None
+        if header != self.stamp:
+            print(f"[!] Checkpoint '{self.path}' is for a different source or settings; starting over.")
+            shutil.rmtree(self.data_dir, ignore_errors=True)
+            return False
+        for line in lines[1:]:
+            try:
+                self.records.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+        if self.records:
+            print(f"[✓] Resuming from checkpoint '{self.path}' ({len(self.records)} records).")
+        return True
+
+    def record(self, kind, **fields):
+        """Append one finished unit of work and force it to disk."""
+        record = {"kind": kind, **fields}
+        self.records.append(record)
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def items(self, kind):
+        return [r for r in self.records if r["kind"] == kind]
+
+    def save_arrays(self, name, **arrays):
+        os.makedirs(self.data_dir, exist_ok=True)
+        tmp_path = os.path.join(self.data_dir, name + ".tmp.npz")
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, os.path.join(self.data_dir, name + ".npz"))
+
+    def load_arrays(self, name):
+        with np.load(os.path.join(self.data_dir, name + ".npz")) as z:
+            return {key: z[key] for key in z.files}
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+    def discard(self):
+        """Delete the journal once the stage's real output is safely written."""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,26 +1,100 @@
-
 import numpy as np
 
 class LogisticRegressionCustom:
-    def __init__(self, input_dim, lr=0.01, epochs=100):
-        self.weights = np.random.randn(input_dim)
-        self.bias = 0
+    # Defaults for instances unpickled from before these options existed
+    batch_size = None
+    dtype = np.dtype(np.float64)
+    validation_split = 0.0
+    patience = None
+    tol = 1e-4
+
+    def __init__(self, input_dim, lr=0.01, epochs=100, batch_size=None, dtype=np.float64,
+                 validation_split=0.0, patience=None, tol=1e-4):
+        self.dtype = np.dtype(dtype)
+        self.weights = np.random.randn(input_dim).astype(self.dtype)
+        self.bias = self.dtype.type(0)
         self.lr = lr
         self.epochs = epochs
+        self.batch_size = batch_size              # None = full-batch gradient descent
+        self.validation_split = validation_split  # fraction of X held out for early stopping
+        self.patience = patience                  # epochs without improvement before stopping
+        self.tol = tol                            # minimum validation loss improvement
 
     def sigmoid(self, x):
-        return 1 / (1 + np.exp(-x))
+        # Numerically stable: exp() only ever sees non-positive arguments.
+        # Integer input is computed in the model's float dtype, never truncated back.
+        x = np.asarray(x, dtype=np.result_type(x, self.dtype))
+        z = np.exp(-np.abs(x))
+        return np.where(x >= 0, 1 / (1 + z), z / (1 + z))[()]
+
+    def _as_batch(self, X, y=None):
+        X = np.asarray(X, dtype=self.dtype)
+        return X if y is None else (X, np.asarray(y, dtype=self.dtype))
+
+    def partial_fit(self, X, y):
+        """One gradient step on a single mini-batch."""
+        X, y = self._as_batch(X, y)
+        error = self.sigmoid(X @ self.weights + self.bias) - y
+        grad_weights = X.T @ error / len(X)
+        grad_bias = np.mean(error)
+        self.weights -= self.dtype.type(self.lr) * grad_weights
+        self.bias -= self.dtype.type(self.lr) * grad_bias
+        return self
+
+    def log_loss(self, X, y):
+        X, y = self._as_batch(X, y)
+        z = X @ self.weights + self.bias
+        # log(1 + exp(z)) - y * z, written to avoid overflow
+        return float(np.mean(np.logaddexp(0, z) - y * z))
+
+    def _iter_minibatches(self, X, y):
+        if not self.batch_size or self.batch_size >= len(X):
+            yield X, y
+            return
+        order = np.random.permutation(len(X))
+        for i in range(0, len(X), self.batch_size):
+            idx = order[i:i + self.batch_size]
+            yield X[idx], y[idx]
 
     def fit(self, X, y):
+        X, y = self._as_batch(X, y)
+        X_val = y_val = None
+        if self.validation_split:
+            n_val = max(1, int(len(X) * self.validation_split))
+            order = np.random.permutation(len(X))
+            X_val, y_val = X[order[:n_val]], y[order[:n_val]]
+            X, y = X[order[n_val:]], y[order[n_val:]]
+        return self.fit_batches(lambda: self._iter_minibatches(X, y), X_val, y_val)
+
+    def fit_batches(self, make_batches, X_val=None, y_val=None):
+        """
+        Mini-batch SGD over data that need not fit in memory.
+        `make_batches` is called once per epoch and must return an iterator
+        of (X, y) batches, e.g. a generator reading carved samples from disk.
+        With validation data and `patience` set, training stops once the
+        validation loss has not improved by `tol` for `patience` epochs and
+        the best weights seen are restored.
+        """
+        early_stopping = X_val is not None and self.patience
+        best_loss, best_params, stale_epochs = np.inf, None, 0
         for _ in range(self.epochs):
-            predictions = self.sigmoid(X @ self.weights + self.bias)
-            error = predictions - y
-            grad_weights = X.T @ error / len(X)
-            grad_bias = np.mean(error)
-            self.weights -= self.lr * grad_weights
-            self.bias -= self.lr * grad_bias
+            for X_batch, y_batch in make_batches():
+                self.partial_fit(X_batch, y_batch)
+
+            if early_stopping:
+                loss = self.log_loss(X_val, y_val)
+                if loss < best_loss - self.tol:
+                    best_loss, best_params, stale_epochs = loss, (self.weights.copy(), self.bias), 0
+                else:
+                    stale_epochs += 1
+                    if stale_epochs >= self.patience:
+                        break
+        if early_stopping and best_params is not None:
+            self.weights, self.bias = best_params
+        return self
 
     def predict(self, X):
+        X = self._as_batch(X)
         return self.sigmoid(X @ self.weights + self.bias)
 
     def accuracy(self, X, y):
@@ -0,0 +1,47 @@
+# dedup_store.py — persistent content-hash index of recovered documents
+
+import hashlib
+import sqlite3
+
+DEDUP_DB = "recovered_hashes.sqlite"
+
+def content_digest(data):
+    """Binary SHA-1 of raw bytes or of a str (UTF-8 encoded)."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha1(data).digest()
+
+class DedupStore:
+    """
+    Set of 20-byte digests kept in SQLite, so recovery runs over different
+    fragments and cases share one index and memory use stays flat.
+    Pass path=None for a throwaway in-memory store.
+    """
+
+    def __init__(self, path=DEDUP_DB):
+        self.conn = sqlite3.connect(path or ":memory:", timeout=60, isolation_level=None)
+        if path:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS seen (digest BLOB PRIMARY KEY) WITHOUT ROWID")
+
+    def __contains__(self, digest):
+        row = self.conn.execute("SELECT 1 FROM seen WHERE digest = ?", (digest,)).fetchone()
+        return row is not None
+
+    def add(self, digest):
+        """Record `digest`; returns True only if it was not already present."""
+        cur = self.conn.execute("INSERT OR IGNORE INTO seen (digest) VALUES (?)", (digest,))
+        return cur.rowcount == 1
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM seen").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
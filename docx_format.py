@@ -0,0 +1,171 @@
+# docx_format.py — ZIP/OOXML structure parsing shared by carving and recovery
+
+import struct
+import zipfile
+import zlib
+from xml.etree import ElementTree
+from utils import DOCX_SIG, DOCX_END
+
+CENTRAL_DIR_SIG = b'PK\x01\x02'
+LOCAL_HEADER = struct.Struct("<4s5H3L2H")  # 30 bytes
+CENTRAL_DIR_HEADER = struct.Struct("<4s6H3L5H2L")  # 46 bytes
+EOCD = struct.Struct("<4s4H2LH")  # 22 bytes
+FLAG_DATA_DESCRIPTOR = 0x08
+MAX_EOCD_SEARCH = EOCD.size + 0xFFFF  # EOCD plus the longest possible comment
+SUPPORTED_METHODS = (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED)
+
+DOCUMENT_XML = b"word/document.xml"
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+W_TEXT = f"{{{W_NS}}}t"
+ENCRYPTED_PACKAGE = b"EncryptedPackage"
+
+# Everything zipfile/ElementTree raise on corrupt or truncated carved archives
+ZIP_ERRORS = (zipfile.BadZipFile, zlib.error, ElementTree.ParseError, EOFError,
+              OSError, KeyError, ValueError, NotImplementedError, RuntimeError)
+
+def _local_entries_reach(buf, start, cd_start):
+    """
+    Walk the local file headers from `start` using their compressed sizes and
+    check that they chain up to the central directory at `cd_start`.
+    Entries written with a data descriptor carry no sizes, so the walk trusts
+    the EOCD from the first such entry on.
+    """
+    pos = start
+    while pos < cd_start:
+        if pos + LOCAL_HEADER.size > cd_start:
+            return False
+        fields = LOCAL_HEADER.unpack_from(buf, pos)
+        sig, flags, comp_size, name_len, extra_len = fields[0], fields[2], fields[7], fields[9], fields[10]
+        if sig != DOCX_SIG:
+            return False
+        if flags & FLAG_DATA_DESCRIPTOR:
+            return True
+        pos += LOCAL_HEADER.size + name_len + extra_len + comp_size
+    return pos == cd_start
+
+def archive_extent(buf, eocd_offset):
+    """
+    Return (start, end) of the ZIP archive closed by the EOCD record at
+    `eocd_offset`, derived from the central directory size and offset stored
+    in the record. Returns None for records that do not describe a complete,
+    single-disk, non-ZIP64 archive inside `buf`.
+    """
+    if eocd_offset + EOCD.size > len(buf):
+        return None
+    (sig, disk, cd_disk, entries_disk, entries_total,
+     cd_size, cd_offset, comment_len) = EOCD.unpack_from(buf, eocd_offset)
+    if sig != DOCX_END or disk != 0 or cd_disk != 0 or entries_disk != entries_total:
+        return None
+    if entries_total == 0 or cd_size == 0xFFFFFFFF or cd_offset == 0xFFFFFFFF:
+        return None
+
+    cd_start = eocd_offset - cd_size
+    start = cd_start - cd_offset
+    end = eocd_offset + EOCD.size + comment_len
+    if start < 0 or end > len(buf):
+        return None
+    if buf[start:start + 4] != DOCX_SIG or buf[cd_start:cd_start + 4] != CENTRAL_DIR_SIG:
+        return None
+    if not _local_entries_reach(buf, start, cd_start):
+        return None
+    return start, end
+
+def zip_extents(buf, eocd_offsets):
+    """
+    Pair EOCD records with their local-header starts.
+    Returns a sorted list of non-overlapping (start, end) archive extents;
+    interior local headers and archives nested inside another one (e.g. a
+    stored embedded .docx) are thereby collapsed into the outer archive.
+    """
+    extents = sorted(
+        extent for extent in (archive_extent(buf, int(off)) for off in eocd_offsets)
+        if extent is not None
+    )
+    collapsed = []
+    for start, end in extents:
+        if collapsed and start < collapsed[-1][1]:
+            # nested in (or overlapping) the previous archive: keep the outer one
+            continue
+        collapsed.append((start, end))
+    return collapsed
+
+def find_all(buf, signature, start=0, end=None):
+    """Return every non-overlapping offset of `signature` in buf[start:end]."""
+    end = len(buf) if end is None else end
+    offsets = []
+    idx = buf.find(signature, start, end)
+    while idx != -1:
+        offsets.append(idx)
+        idx = buf.find(signature, idx + len(signature), end)
+    return offsets
+
+def probe_docx(buf, start=0, end=None):
+    """
+    Cheap structural check of the ZIP candidate in buf[start:end], without
+    building a zipfile.ZipFile or copying the candidate out of `buf`.
+
+    Checks the first local header, locates the EOCD the way zipfile does
+    (within the trailing 64 KB) and walks the central directory names.
+    Returns "docx" if word/document.xml is present, "encrypted" if only an
+    EncryptedPackage is present, and None for anything else.
+    """
+    end = len(buf) if end is None else end
+    if end - start < LOCAL_HEADER.size + EOCD.size:
+        return None
+    fields = LOCAL_HEADER.unpack_from(buf, start)
+    version, method, name_len = fields[1], fields[3], fields[9]
+    if fields[0] != DOCX_SIG or version > 63 or method not in SUPPORTED_METHODS or name_len == 0:
+        return None
+
+    eocd = buf.rfind(DOCX_END, max(start, end - MAX_EOCD_SEARCH), end)
+    if eocd == -1 or eocd + EOCD.size > end:
+        return None
+    entries, cd_size = EOCD.unpack_from(buf, eocd)[4:6]
+    pos = eocd - cd_size
+    if pos < start:
+        return None
+
+    names = set()
+    for _ in range(entries):
+        if pos + CENTRAL_DIR_HEADER.size > eocd:
+            return None
+        header = CENTRAL_DIR_HEADER.unpack_from(buf, pos)
+        if header[0] != CENTRAL_DIR_SIG:
+            return None
+        name_len, extra_len, comment_len = header[10], header[11], header[12]
+        name_start = pos + CENTRAL_DIR_HEADER.size
+        names.add(bytes(buf[name_start:name_start + name_len]))
+        pos = name_start + name_len + extra_len + comment_len
+
+    if DOCUMENT_XML in names:
+        return "docx"
+    if ENCRYPTED_PACKAGE in names:
+        return "encrypted"
+    return None
+
+def iter_docx_text(zf, max_chars=None):
+    """
+    Yield the text of each w:t run in word/document.xml of an open ZipFile.
+    The part is streamed through iterparse and every element is dropped from
+    the tree as soon as it closes, so memory does not grow with the document.
+    Stops once `max_chars` characters have been yielded.
+    """
+    remaining = max_chars
+    open_elements = []
+    with zf.open("word/document.xml") as xml_file:
+        for event, elem in ElementTree.iterparse(xml_file, events=("start", "end")):
+            if event == "start":
+                open_elements.append(elem)
+                continue
+            open_elements.pop()
+            if elem.tag == W_TEXT and elem.text:
+                text = elem.text if remaining is None else elem.text[:remaining]
+                yield text
+                if remaining is not None:
+                    remaining -= len(text)
+                    if remaining <= 0:
+                        return
+            elem.clear()
+            if open_elements:
+                # a closing element is always the last child of its parent
+                del open_elements[-1][-1]
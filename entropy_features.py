@@ -0,0 +1,46 @@
+# entropy_features.py — byte-histogram features shared by analysis and gui_logic
+
+import numpy as np
+from utils import BLOCK_SIZE
+
+# bytes 32..126, the printable ASCII range used by the encryption model
+PRINTABLE = np.zeros(256, dtype=bool)
+PRINTABLE[32:127] = True
+
+def byte_histogram(data):
+    """Count of each byte value 0..255 in a bytes-like object."""
+    return np.bincount(np.frombuffer(data, dtype=np.uint8), minlength=256)
+
+def file_histogram(path, block_size=BLOCK_SIZE):
+    """Byte histogram of a file, read in bounded blocks of `block_size`."""
+    hist = np.zeros(256, dtype=np.int64)
+    buf = bytearray(block_size)
+    view = memoryview(buf)
+    with open(path, "rb") as f:
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            hist += byte_histogram(view[:n])
+    return hist
+
+def entropy_from_histogram(hist):
+    """Shannon entropy in bits per byte."""
+    total = hist.sum()
+    if total == 0:
+        return 0.0
+    p = hist[hist > 0] / total
+    return float(-(p * np.log2(p)).sum())
+
+def features_from_histogram(hist):
+    """[entropy, uniformity, printable_ratio] as consumed by the RF encryption model."""
+    total = hist.sum()
+    entropy = entropy_from_histogram(hist)
+    uniformity = np.count_nonzero(hist) / 256
+    printable_ratio = hist[PRINTABLE].sum() / total if total > 0 else 0
+    return [entropy, uniformity, printable_ratio]
+
+def feature_matrix(buffers):
+    """Stack the features of many bytes-like objects into an (n, 3) float array."""
+    rows = [features_from_histogram(byte_histogram(data)) for data in buffers]
+    return np.array(rows, dtype=np.float64).reshape(-1, 3)
@@ -0,0 +1,107 @@
+# entropy_map.py — sliding-window entropy map of a whole raw dump
+
+import os
+import mmap
+import numpy as np
+from entropy_features import byte_histogram
+from utils import pool_map, worker_count
+
+MAP_FILE = "entropy_map.npz"
+ENTROPY_WINDOW = 64 * 1024  # 64 KB per window
+ENTROPY_STRIDE = 64 * 1024  # window step; must divide ENTROPY_WINDOW
+ENTROPY_THRESHOLD = 7.5  # bits/byte; encrypted (and compressed) data sits close to 8.0
+WINDOWS_PER_TASK = 4096  # windows computed by one worker task
+
+def _window_count(size, window, stride):
+    # only full windows are mapped; a tail shorter than one window is left out
+    return 0 if size < window else (size - window) // stride + 1
+
+def _entropy_rows(hists, total):
+    p = hists / total
+    with np.errstate(divide="ignore", invalid="ignore"):
+        terms = np.where(p > 0, p * np.log2(p), 0.0)
+    return -terms.sum(axis=1)
+
+def _map_windows(args):
+    """
+    Worker function: entropy of `count` consecutive windows starting at window `first`.
+    Histograms are taken once per stride-sized block; each window's histogram
+    is the sum of the window // stride blocks it spans.
+    """
+    dump_path, first, count, window, stride = args
+    per_window = window // stride
+    n_blocks = count + per_window - 1
+    start = first * stride
+
+    block_hists = np.zeros((n_blocks + 1, 256), dtype=np.int64)
+    with open(dump_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        view = memoryview(mm)
+        try:
+            for i in range(n_blocks):
+                offset = start + i * stride
+                block_hists[i + 1] = byte_histogram(view[offset:offset + stride])
+        finally:
+            view.release()
+
+    cumulative = np.cumsum(block_hists, axis=0)
+    window_hists = cumulative[per_window:] - cumulative[:-per_window]
+    return _entropy_rows(window_hists, window).astype(np.float32)
+
+def compute_entropy_map(dump_path, window=ENTROPY_WINDOW, stride=ENTROPY_STRIDE, num_workers=None,
+                        progress=None):
+    """
+    Entropy (bits/byte) of every `window`-byte window of the dump, stepping
+    by `stride`, computed in parallel over mmap. Returns a float32 array;
+    element i covers dump bytes [i * stride, i * stride + window).
+    `progress`, if given, is called with windows_done/total_windows per task.
+    """
+    if window % stride:
+        raise ValueError("Entropy window must be a multiple of the stride")
+
+    n_windows = _window_count(os.path.getsize(dump_path), window, stride)
+    tasks = [
+        (dump_path, first, min(WINDOWS_PER_TASK, n_windows - first), window, stride)
+        for first in range(0, n_windows, WINDOWS_PER_TASK)
+    ]
+    if not tasks:
+        return np.empty(0, dtype=np.float32)
+
+    num_workers = min(num_workers or worker_count(), len(tasks))
+    done = [0]
+
+    def on_result(part):
+        done[0] += len(part)
+        if progress:
+            progress(windows_done=done[0], total_windows=n_windows)
+
+    return np.concatenate(pool_map(_map_windows, tasks, num_workers, on_result))
+
+def save_entropy_map(entropies, window, stride, map_path=MAP_FILE):
+    np.savez_compressed(map_path, entropy=entropies, window=window, stride=stride)
+
+def load_entropy_map(map_path=MAP_FILE):
+    """Return (entropies, window, stride) saved by save_entropy_map."""
+    with np.load(map_path) as z:
+        return z["entropy"], int(z["window"]), int(z["stride"])
+
+def build_entropy_map(dump_path, map_path=MAP_FILE, window=ENTROPY_WINDOW, stride=ENTROPY_STRIDE, num_workers=None,
+                      progress=None):
+    entropies = compute_entropy_map(dump_path, window, stride, num_workers, progress)
+    save_entropy_map(entropies, window, stride, map_path)
+    return entropies
+
+def high_entropy_regions(entropies, window=ENTROPY_WINDOW, stride=ENTROPY_STRIDE, threshold=ENTROPY_THRESHOLD):
+    """
+    Merge consecutive windows above `threshold` into (start, end, mean_entropy)
+    byte regions of the dump: candidate encrypted containers.
+    """
+    above = np.concatenate(([False], entropies > threshold, [False]))
+    edges = np.flatnonzero(np.diff(above.astype(np.int8)))
+    regions = []
+    for first, last in zip(edges[::2], edges[1::2]):
+        regions.append((
+            int(first) * stride,
+            int(last - 1) * stride + window,
+            round(float(entropies[first:last].mean()), 4),
+        ))
+    return regions
@@ -3,17 +3,24 @@ from custom_models import LogisticRegressionCustom
 import tkinter as tk
 from tkinter import filedialog, messagebox
 import os
-import json
 from datetime import datetime
 from log_utils import write_log
-from analysis import analyze_files
+from jobs import JobRunner
+from checkpoint import checkpoint_path
+from instrumentation import METRICS_FILE, JsonMetricsSink, QueueSink, add_sink, format_event
+from analysis import iter_analyze_files
+from report_store import REPORT_FILE, reset_report, append_records, export_json
 from slot_scanner import scan_and_create_accurate_fragment
-from slot_recovery import recover_docx_from_fragment
+from slot_recovery import iter_recover_docx, recover_docx_parallel, MAX_DOCX_TOTAL
 from slot_image_recovery import extract_images_from_all_docx
-from gui_logic import run_ml_classification, show_keyword_cloud, show_slot_chart
+from entropy_map import build_entropy_map, high_entropy_regions
+from gui_logic import run_ml_classification, show_keyword_cloud, show_slot_chart, show_entropy_map
 
 # Global state
 log_box = None
+status_label = None
+job_runner = None
+job_counters = {}
 selected_dump_path = ""
 slots_stats = (0, 0)
 
@@ -32,29 +39,110 @@ def browse_file(entry):
     log_box.insert(tk.END, f"[✓] {msg}\n")
     write_log(msg, action_type="select_dump", filename=os.path.basename(selected_dump_path))
 
+def _format_counters(counters):
+    parts = []
+    for key, value in counters.items():
+        if key.endswith("bytes") or key in ("bytes_scanned", "offset"):
+            value = f"{value / (1024 * 1024):.0f} MB"
+        parts.append(f"{key.replace('_', ' ')}: {value}")
+    return ", ".join(parts)
+
+def on_job_progress(job, counters):
+    # stages report different counters at different times; show the latest of each
+    job_counters.update(counters)
+    status_label.config(text=f"{job.name} — {_format_counters(job_counters)}")
+
+def on_metric(event):
+    if event["event"] == "stage_end":
+        log_box.insert(tk.END, f"[i] {format_event(event)}\n")
+        log_box.see(tk.END)
+
+def start_job(name, func, *args, on_done=None, error_title="Error", **kwargs):
+    """Run a pipeline stage in the background; only one stage runs at a time."""
+    if job_runner.busy:
+        messagebox.showwarning("Busy", f"'{job_runner.current.name}' is still running")
+        return
+
+    def finished(text):
+        status_label.config(text=text)
+
+    def done(result):
+        finished(f"{name} — finished")
+        if on_done:
+            on_done(result)
+
+    def failed(e):
+        finished(f"{name} — failed")
+        log_box.insert(tk.END, f"[!] {name} failed: {e}\n")
+        messagebox.showerror(error_title, str(e))
+
+    def cancelled():
+        finished(f"{name} — cancelled")
+        log_box.insert(tk.END, f"[!] {name} cancelled\n")
+        write_log(f"{name} cancelled", action_type="cancel")
+
+    job_counters.clear()
+    status_label.config(text=f"{name} — running")
+    job_runner.start(name, func, *args, on_done=done, on_error=failed, on_cancel=cancelled, **kwargs)
+
+def cancel_job():
+    if job_runner.busy:
+        status_label.config(text=f"{job_runner.current.name} — cancelling...")
+        job_runner.cancel()
+
 def extract_fragments():
-    global slots_stats
     if not selected_dump_path:
         messagebox.showerror("Error", "No dump file selected")
         return
-    valid, total = scan_and_create_accurate_fragment(selected_dump_path)
-    slots_stats = (valid, total)
-    msg = f"Extracted {valid} valid fragments from {total} scanned slots."
-    log_box.insert(tk.END, f"[✓] {msg}\n")
-    write_log(msg, action_type="extract_fragments", filename=os.path.basename(selected_dump_path))
-    messagebox.showinfo("Done", msg)
+    dump_path = selected_dump_path
+
+    def done(result):
+        global slots_stats
+        valid, total = result
+        slots_stats = (valid, total)
+        msg = f"Extracted {valid} valid fragments from {total} scanned slots."
+        log_box.insert(tk.END, f"[✓] {msg}\n")
+        write_log(msg, action_type="extract_fragments", filename=os.path.basename(dump_path))
+        messagebox.showinfo("Done", msg)
+
+    start_job("Extract fragments", scan_and_create_accurate_fragment, dump_path, on_done=done)
+
+def _recover_fragments(fragments, progress=None):
+    # a cancelled or crashed recovery of the same fragments resumes from here
+    resume_from = checkpoint_path("recover", fragments)
+    if len(fragments) > 1:
+        # several parts at once: spread them over the process pool
+        return recover_docx_parallel(fragments, progress=progress, checkpoint_path=resume_from)
+    return list(iter_recover_docx(fragments[0], max_docs=MAX_DOCX_TOTAL, progress=progress,
+                                  checkpoint_path=resume_from))
 
 def browse_fragment():
-    fragment = filedialog.askopenfilename(title="Select Fragment (.bin)", filetypes=[("Fragment", "*.bin")])
-    if not fragment:
+    if job_runner.busy:
+        messagebox.showwarning("Busy", f"'{job_runner.current.name}' is still running")
         return
-    log_box.insert(tk.END, f"[✓] Selected fragment: {fragment}\n")
-    write_log("Selected fragment", action_type="select_fragment", filename=os.path.basename(fragment))
-    recovered_files = recover_docx_from_fragment(fragment)
-    msg = f"Recovered {len(recovered_files)} valid .docx files from fragment."
-    log_box.insert(tk.END, f"[✓] {msg}\n")
-    write_log(msg, action_type="recovery", filename=os.path.basename(fragment))
-    messagebox.showinfo("Recovery", msg)
+    fragments = filedialog.askopenfilenames(title="Select Fragments (.bin) or Manifest (.json)",
+                                            filetypes=[("Fragment", "*.bin"), ("Fragment Manifest", "*.json")])
+    if not fragments:
+        return
+    for fragment in fragments:
+        log_box.insert(tk.END, f"[✓] Selected fragment: {fragment}\n")
+        write_log("Selected fragment", action_type="select_fragment", filename=os.path.basename(fragment))
+
+    def done(recovered_files):
+        for path in recovered_files:
+            log_box.insert(tk.END, f"    recovered {os.path.basename(path)}\n")
+        msg = f"Recovered {len(recovered_files)} valid .docx files from {len(fragments)} fragment(s)."
+        log_box.insert(tk.END, f"[✓] {msg}\n")
+        write_log(msg, action_type="recovery", filename=", ".join(os.path.basename(f) for f in fragments))
+        messagebox.showinfo("Recovery", msg)
+
+    start_job("Recover documents", _recover_fragments, list(fragments), on_done=done)
+
+def _analyze_recovered(files, progress=None):
+    # one record per file, written as soon as its analysis finishes
+    reset_report(REPORT_FILE)
+    append_records(iter_analyze_files(files, progress=progress), REPORT_FILE)
+    extract_images_from_all_docx()
 
 def run_analysis():
     recovered_path = "recovered_docs_from_fragment"
@@ -63,22 +151,21 @@ def run_analysis():
         return
     files = [os.path.join(recovered_path, f) for f in os.listdir(recovered_path)
              if f.endswith(".docx") or f.endswith(".doc")]
-    report = analyze_files(files)
-    with open("forensic_report.json", "w", encoding="utf-8") as f:
-        json.dump(report, f, indent=2, ensure_ascii=False)
-    extract_images_from_all_docx()
-    msg = "Forensic analysis completed and report saved"
-    log_box.insert(tk.END, f"[✓] {msg}\n")
-    write_log(msg, action_type="analysis")
+
+    def done(_):
+        msg = "Forensic analysis completed and report saved"
+        log_box.insert(tk.END, f"[✓] {msg}\n")
+        write_log(msg, action_type="analysis")
+
+    start_job("Forensic analysis", _analyze_recovered, files, on_done=done)
 
 def run_ml():
-    try:
-        report = run_ml_classification()
+    def done(_):
         msg = "ML analysis completed and saved"
         log_box.insert(tk.END, f"[✓] {msg}\n")
         write_log(msg, action_type="ml_classification")
-    except Exception as e:
-        messagebox.showerror("Error", str(e))
+
+    start_job("ML classification", run_ml_classification, on_done=done)
 
 def show_keywords():
     try:
@@ -92,6 +179,26 @@ def show_chart():
     except Exception as e:
         messagebox.showerror("Chart Error", str(e))
 
+def show_entropy():
+    if not selected_dump_path:
+        messagebox.showerror("Error", "No dump file selected")
+        return
+    dump_path = selected_dump_path
+
+    def done(entropies):
+        regions = high_entropy_regions(entropies)
+        msg = f"Entropy map built: {len(regions)} high-entropy regions found."
+        log_box.insert(tk.END, f"[✓] {msg}\n")
+        for start, end, mean in regions:
+            log_box.insert(tk.END, f"    0x{start:012x} - 0x{end:012x} ({(end - start) // 1024} KB, {mean} bits/byte)\n")
+        write_log(msg, action_type="entropy_map", filename=os.path.basename(dump_path))
+        try:
+            show_entropy_map()
+        except Exception as e:
+            messagebox.showerror("Entropy Error", str(e))
+
+    start_job("Entropy map", build_entropy_map, dump_path, on_done=done, error_title="Entropy Error")
+
 def show_security_policy_window():
     policy_text = """
 Security Policy
@@ -146,8 +253,7 @@ If you have questions about our policy or wish to report a security issue, pleas
     tk.Label(window, text="📧 tommyzh531@gmail.com", font=FONT, bg=BG_COLOR, fg="blue").pack(pady=(0, 10))
 
 def download_report():
-    report_file = "forensic_report.json"
-    if not os.path.exists(report_file):
+    if not os.path.exists(REPORT_FILE):
         messagebox.showerror("Error", "No forensic report found")
         return
 
@@ -157,14 +263,11 @@ def download_report():
         filetypes=[("JSON Files", "*.json")]
     )
     if save_path:
-        with open(report_file, "r", encoding="utf-8") as src:
-            content = src.read()
-        with open(save_path, "w", encoding="utf-8") as dst:
-            dst.write(content)
+        export_json(REPORT_FILE, save_path)
         messagebox.showinfo("Success", f"Report saved to: {save_path}")
 
 def launch_gui():
-    global log_box
+    global log_box, status_label, job_runner
     root = tk.Tk()
     root.title("ForenDOC - Document Recovery Forensics")
     root.configure(bg=BG_COLOR)
@@ -195,9 +298,20 @@ def launch_gui():
 
     add_side_button("Show Keywords", show_keywords)
     add_side_button("Show Chart", show_chart)
+    add_side_button("Entropy Map", show_entropy)
     add_side_button("Security Policy", show_security_policy_window)
     add_side_button("Download Report", download_report)
 
+    status_frame = tk.Frame(root, bg=BG_COLOR)
+    status_frame.pack(fill="x", padx=10)
+    status_label = tk.Label(status_frame, text="Idle", anchor="w", bg=BG_COLOR, fg=FG_COLOR, font=FONT)
+    status_label.pack(side=tk.LEFT, fill="x", expand=True)
+    tk.Button(status_frame, text="Cancel", command=cancel_job, font=FONT, bg="#cccccc", fg="black", width=10).pack(side=tk.RIGHT)
+    job_runner = JobRunner(root, on_progress=on_job_progress, on_metric=on_metric)
+    # stage timings and candidate counts go to the log box and to a metrics file
+    add_sink(QueueSink(job_runner.events))
+    add_sink(JsonMetricsSink(METRICS_FILE))
+
     log_box_frame = tk.Frame(root, bg=BG_COLOR)
     log_box_frame.pack(pady=10)
     log_box = tk.Text(log_box_frame, height=10, width=100, bg="white", fg="black")
@@ -1,70 +1,163 @@
 import os
 import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import numpy as np
-import joblib
-import matplotlib.pyplot as plt
 from tkinter import messagebox
-from wordcloud import WordCloud
+from entropy_features import feature_matrix
+from report_store import REPORT_FILE, load_report, append_records, compact_report
+from prediction_cache import PredictionCache, PREDICTION_CACHE
+from dedup_store import content_digest
+from inference_worker import predict_remote
+from instrumentation import stage
+from entropy_map import MAP_FILE, ENTROPY_THRESHOLD, load_entropy_map, high_entropy_regions
+
+# === Pretrained ML models, unpickled on first use so GUI startup stays fast ===
+# resolved next to this file, so headless jobs can run from any working directory
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_FILES = {
+    "rf": os.path.join(MODEL_DIR, "rf_encryption_model.pkl"),          # For encryption detection
+    "ensemble": os.path.join(MODEL_DIR, "ensemble_classifier.pkl"),    # For category classification
+}
+ML_BATCH_SIZE = 256  # documents per predict() call
+
+@lru_cache(maxsize=None)
+def get_model(name):
+    import joblib
+    return joblib.load(MODEL_FILES[name])
+
+@lru_cache(maxsize=None)
+def model_version():
+    """Content hash of both model files; cached predictions are only reused for the same models."""
+    digest = hashlib.sha1()
+    for name in sorted(MODEL_FILES):
+        with open(MODEL_FILES[name], "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def predict_local(texts):
+    """Run both models in this process on a batch of texts."""
+    # Feature engineering for RF encryption model: [entropy, uniformity, printable_ratio]
+    X_entropy = feature_matrix(text.encode("utf-8", errors="ignore") for text in texts)
+    encryption_preds = get_model("rf").predict(X_entropy)
 
-# === Load pretrained ML models ===
-rf_model = joblib.load("rf_encryption_model.pkl")         # For encryption detection
-ensemble_model = joblib.load("ensemble_classifier.pkl")   # For category classification
-
-# === Run ML classification and write predictions to forensic_report.json ===
-def run_ml_classification(report_path="forensic_report.json"):
+    # Use the ensemble model to classify document category
+    X_text = np.array([text[:3000] for text in texts])  # Truncate for safety if needed
+    category_preds = get_model("ensemble").predict(X_text)
+
+    return [
+        ("Encrypted" if encryption_preds[i] == 1 else "Not Encrypted", str(category_preds[i]))
+        for i in range(len(texts))
+    ]
+
+def _predict_batch(texts, stats=None):
+    # a resident inference worker, if one is running, saves unpickling the models here
+    labels = predict_remote(texts, model_version())
+    if stats is not None:
+        stats.count("remote_batches" if labels is not None else "local_batches")
+    if labels is None:
+        labels = predict_local(texts)
+    return [tuple(label) for label in labels]
+
+def classify_texts(texts, batch_size=ML_BATCH_SIZE, n_jobs=1, cache_path=PREDICTION_CACHE, progress=None):
+    """
+    Return (ml_encryption, ml_category) for each text.
+    Predictions are looked up in the persistent cache by text hash and model
+    version first; only unseen texts are run through the models, in batches
+    of `batch_size`, over `n_jobs` threads sharing the loaded models. Each
+    batch is cached as soon as it completes, so a cancelled or crashed run
+    keeps the predictions it already made.
+    `progress`, if given, is called with docs_classified/total_docs per batch.
+    """
+    with stage("classify", docs=len(texts), n_jobs=n_jobs) as st:
+        digests = [content_digest(text) for text in texts]
+        version = model_version()
+        with PredictionCache(cache_path) as cache:
+            known = cache.get_many(digests, version)
+            cached = len(known)
+
+            # each unseen text is predicted once, however often it occurs
+            todo = {}
+            for digest, text in zip(digests, texts):
+                if digest not in known:
+                    todo.setdefault(digest, text)
+            todo_digests = list(todo)
+            batches = [
+                [todo[d] for d in todo_digests[i:i + batch_size]]
+                for i in range(0, len(todo_digests), batch_size)
+            ]
+
+            labels = []
+
+            def add_batch(batch_labels):
+                # batches complete in order, so they line up with todo_digests
+                batch_digests = todo_digests[len(labels):len(labels) + len(batch_labels)]
+                rows = [(digest, enc, cat) for digest, (enc, cat) in zip(batch_digests, batch_labels)]
+                cache.put_many(rows, version)
+                known.update((digest, (enc, cat)) for digest, enc, cat in rows)
+                labels.extend(batch_labels)
+                if progress:
+                    progress(docs_classified=cached + len(labels), total_docs=cached + len(todo_digests))
+
+            if n_jobs > 1 and len(batches) > 1:
+                executor = ThreadPoolExecutor(max_workers=n_jobs)
+                try:
+                    for batch_labels in executor.map(lambda batch: _predict_batch(batch, st), batches):
+                        add_batch(batch_labels)
+                finally:
+                    executor.shutdown(wait=True, cancel_futures=True)
+            else:
+                for batch in batches:
+                    add_batch(_predict_batch(batch, st))
+        st.add_bytes(sum(len(todo[d].encode("utf-8", errors="ignore")) for d in todo_digests))
+        st.count("cached", len(digests) - len(todo_digests))
+        st.count("predicted", len(todo_digests))
+    return [known[digest] for digest in digests]
+
+# === Run ML classification and append predictions to the report store ===
+def run_ml_classification(report_path=REPORT_FILE, batch_size=ML_BATCH_SIZE, n_jobs=1, cache_path=PREDICTION_CACHE,
+                          progress=None):
     if not os.path.exists(report_path):
-        raise FileNotFoundError("forensic_report.json not found")
+        raise FileNotFoundError(f"{report_path} not found")
+    if report_path.endswith(".json"):
+        # predictions are appended as JSON lines, which would corrupt a single-document report
+        raise ValueError(f"{report_path} is a legacy .json report; run the analysis again to get a .jsonl report")
 
-    with open(report_path, "r", encoding="utf-8") as f:
-        try:
-            report = json.load(f)
-        except json.JSONDecodeError:
-            raise ValueError("Invalid JSON format in forensic_report.json")
+    try:
+        report = load_report(report_path, fields=("extracted_text",))
+    except json.JSONDecodeError:
+        raise ValueError(f"Invalid JSON format in {report_path}")
 
     names = list(report.keys())
     texts = [report[name].get("extracted_text", "") for name in names]
+    labels = classify_texts(texts, batch_size, n_jobs, cache_path, progress)
 
-    # Feature engineering for RF encryption model
-    def extract_entropy_features(text):
-        from collections import Counter
-        import math
-        byte_data = text.encode("utf-8", errors="ignore")
-        counter = Counter(byte_data)
-        total = len(byte_data)
-        entropy = -sum((c / total) * math.log2(c / total) for c in counter.values()) if total > 0 else 0
-        uniformity = len(counter) / 256
-        printable_ratio = sum(c in range(32, 127) for c in byte_data) / total if total > 0 else 0
-        return [entropy, uniformity, printable_ratio]
-
-    X_entropy = np.array([extract_entropy_features(text) for text in texts])
-    encryption_preds = rf_model.predict(X_entropy)
-
-    # Use the ensemble model to classify document category
-    X_text = np.array([text[:3000] for text in texts])  # Truncate for safety if needed
-    category_preds = ensemble_model.predict(X_text)
-
-    for i, name in enumerate(names):
-        report[name]["ml_encryption"] = "Encrypted" if encryption_preds[i] == 1 else "Not Encrypted"
-        report[name]["ml_category"] = str(category_preds[i])
+    predictions = {
+        name: {"ml_encryption": enc, "ml_category": cat}
+        for name, (enc, cat) in zip(names, labels)
+    }
 
-    with open(report_path, "w", encoding="utf-8") as f:
-        json.dump(report, f, indent=2, ensure_ascii=False)
-
-    return report
+    # ML columns are appended by key, then merged into one line per document
+    # so that repeated runs do not keep growing the report
+    append_records(predictions.items(), report_path)
+    compact_report(report_path)
+    return predictions
 
 # === Generate a keyword cloud from extracted text ===
-def show_keyword_cloud(json_path="forensic_report.json", bg_color="#1e1e2f"):
+def show_keyword_cloud(json_path=REPORT_FILE, bg_color="#1e1e2f"):
     if not os.path.exists(json_path):
-        raise FileNotFoundError("forensic_report.json not found")
+        raise FileNotFoundError(f"{json_path} not found")
 
-    with open(json_path, "r", encoding="utf-8") as f:
-        report = json.load(f)
+    report = load_report(json_path, fields=("extracted_text",))
 
     text = " ".join(info.get("extracted_text", "") for info in report.values())
     if not text.strip():
         messagebox.showinfo("Info", "No extracted text found for word cloud.")
         return
 
+    import matplotlib.pyplot as plt
+    from wordcloud import WordCloud
     wc = WordCloud(width=800, height=400, background_color=bg_color, colormap="viridis").generate(text)
     plt.imshow(wc, interpolation='bilinear')
     plt.axis("off")
@@ -85,6 +178,7 @@ def show_slot_chart(slots_stats):
         messagebox.showerror("Error", "Both valid and empty slots are zero.")
         return
 
+    import matplotlib.pyplot as plt
     labels = ['Valid .docx Slots', 'Empty Slots']
     colors = ['#4CAF50', '#F44336']
 
@@ -93,3 +187,27 @@ def show_slot_chart(slots_stats):
     plt.title("DOCX Signature Density in Dump")
     plt.axis("equal")
     plt.show()
+
+# === Plot the sliding-window entropy map of the dump with high-entropy regions ===
+def show_entropy_map(map_path=MAP_FILE, threshold=ENTROPY_THRESHOLD):
+    if not os.path.exists(map_path):
+        raise FileNotFoundError(f"{map_path} not found")
+
+    entropies, window, stride = load_entropy_map(map_path)
+    if len(entropies) == 0:
+        messagebox.showinfo("Info", "Dump is smaller than one entropy window.")
+        return
+
+    import matplotlib.pyplot as plt
+    offsets_mb = np.arange(len(entropies)) * stride / (1024 * 1024)
+    plt.figure(figsize=(10, 4))
+    plt.plot(offsets_mb, entropies, color="#2196F3", linewidth=0.8)
+    plt.axhline(threshold, color="#F44336", linestyle="--", label=f"Threshold {threshold}")
+    for start, end, _ in high_entropy_regions(entropies, window, stride, threshold):
+        plt.axvspan(start / (1024 * 1024), end / (1024 * 1024), color="#F44336", alpha=0.2)
+    plt.xlabel("Offset in dump (MB)")
+    plt.ylabel("Entropy (bits/byte)")
+    plt.ylim(0, 8.1)
+    plt.title(f"Entropy Map ({window // 1024} KB windows)")
+    plt.legend(loc="lower right")
+    plt.show()
@@ -0,0 +1,195 @@
+# image_format.py — JPEG/PNG/GIF/BMP structure parsing for carving images from raw dumps
+#
+# Every *_length(buf, start, end) walks the format's own structure from a
+# header at `start` and returns the exact byte length of the image, or None
+# when the bytes are not a complete image ending before `end`. `buf` is any
+# bytes-like object, normally an mmap of the whole dump.
+
+import struct
+import zlib
+
+JPEG_SIG = b'\xFF\xD8\xFF'
+PNG_SIG = b'\x89PNG\r\n\x1a\n'
+GIF87_SIG = b'GIF87a'
+GIF89_SIG = b'GIF89a'
+BMP_SIG = b'BM'
+
+IMAGE_SIGNATURES = {
+    "jpeg": JPEG_SIG,
+    "png": PNG_SIG,
+    "gif87": GIF87_SIG,
+    "gif89": GIF89_SIG,
+    "bmp": BMP_SIG,
+}
+EXTENSIONS = {"jpeg": ".jpg", "png": ".png", "gif87": ".gif", "gif89": ".gif", "bmp": ".bmp"}
+
+PNG_CHUNK = struct.Struct(">L4s")  # length, type
+PNG_IEND = b"IEND"
+GIF_SCREEN = struct.Struct("<HHB")  # width, height, packed flags
+BMP_FILE_HEADER = struct.Struct("<2sL4xLL")  # 18 bytes incl. DIB header size
+BMP_CORE_HEADER = struct.Struct("<HHHH")  # BITMAPCOREHEADER: width, height, planes, bpp
+BMP_INFO_HEADER = struct.Struct("<llHHL")  # BITMAPINFOHEADER: width, height, planes, bpp, compression
+BMP_DIB_SIZES = (12, 40, 52, 56, 64, 108, 124)
+BMP_BIT_COUNTS = (1, 4, 8, 16, 24, 32)
+
+# JPEG markers that carry no length field
+JPEG_EOI = 0xD9
+JPEG_SOS = 0xDA
+JPEG_STANDALONE = {0x01} | set(range(0xD0, 0xD8))  # TEM, RST0-7
+# SOF0-SOF15 minus DHT (C4), JPG (C8) and DAC (CC)
+JPEG_SOF = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+def jpeg_length(buf, start, end):
+    """
+    Walk the marker segments from SOI to EOI. Entropy-coded data after each
+    SOS is skipped up to the next real marker (not a stuffed FF00 or RSTn),
+    and segments are skipped by their lengths, so EXIF thumbnails inside
+    APP1 never end the walk early. A frame header and a scan are required.
+    """
+    pos = start + 2
+    seen_sof = seen_sos = False
+    while pos + 2 <= end:
+        if buf[pos] != 0xFF:
+            return None
+        while pos + 2 < end and buf[pos + 1] == 0xFF:  # fill bytes
+            pos += 1
+        marker = buf[pos + 1]
+        if marker == JPEG_EOI:
+            return pos + 2 - start if seen_sof and seen_sos else None
+        if marker in JPEG_STANDALONE:
+            pos += 2
+            continue
+        if marker == 0x00:
+            return None
+        if pos + 4 > end:
+            return None
+        seg_len = (buf[pos + 2] << 8) | buf[pos + 3]
+        if seg_len < 2:
+            return None
+        pos += 2 + seg_len
+        seen_sof = seen_sof or marker in JPEG_SOF
+        if marker != JPEG_SOS:
+            continue
+        seen_sos = True
+        while True:
+            pos = buf.find(b'\xFF', pos, end - 1)
+            if pos == -1:
+                return None
+            following = buf[pos + 1]
+            if following == 0x00 or 0xD0 <= following <= 0xD7:
+                pos += 2
+            else:
+                break
+    return None
+
+def png_length(buf, start, end):
+    """
+    Walk the chunk list from IHDR to IEND by the chunk lengths. The IHDR CRC
+    is checked so stray signatures and damaged headers are rejected up front.
+    """
+    pos = start + len(PNG_SIG)
+    if pos + PNG_CHUNK.size + 17 > end:
+        return None
+    length, chunk_type = PNG_CHUNK.unpack_from(buf, pos)
+    if chunk_type != b"IHDR" or length != 13:
+        return None
+    crc, = struct.unpack_from(">L", buf, pos + 21)
+    if zlib.crc32(buf[pos + 4:pos + 21]) != crc:
+        return None
+    while pos + PNG_CHUNK.size <= end:
+        length, chunk_type = PNG_CHUNK.unpack_from(buf, pos)
+        if length > 0x7FFFFFFF or not chunk_type.isalpha():
+            return None
+        pos += PNG_CHUNK.size + length + 4  # header, data, CRC
+        if pos > end:
+            return None
+        if chunk_type == PNG_IEND:
+            return pos - start
+    return None
+
+def _skip_gif_sub_blocks(buf, pos, end):
+    # data sub-blocks: a size byte and that many bytes, until a zero size
+    while pos < end:
+        size = buf[pos]
+        pos += 1 + size
+        if size == 0:
+            return pos
+    return None
+
+def gif_length(buf, start, end):
+    """
+    Walk the logical screen descriptor, colour tables, extensions and image
+    blocks up to the 0x3B trailer. At least one image block is required.
+    """
+    if start + 13 > end:
+        return None
+    width, height, packed = GIF_SCREEN.unpack_from(buf, start + 6)
+    if width == 0 or height == 0:
+        return None
+    pos = start + 13
+    if packed & 0x80:
+        pos += 3 * (2 << (packed & 0x07))  # global colour table
+    images = 0
+    while pos is not None and pos < end:
+        block = buf[pos]
+        if block == 0x3B:
+            return pos + 1 - start if images else None
+        if block == 0x21:  # extension: label byte, then sub-blocks
+            pos = _skip_gif_sub_blocks(buf, pos + 2, end)
+        elif block == 0x2C:  # image descriptor
+            if pos + 11 > end:
+                return None
+            packed = buf[pos + 9]
+            pos += 10
+            if packed & 0x80:
+                pos += 3 * (2 << (packed & 0x07))  # local colour table
+            if pos >= end or not 2 <= buf[pos] <= 12:  # LZW minimum code size
+                return None
+            pos = _skip_gif_sub_blocks(buf, pos + 1, end)
+            images += 1
+        else:
+            return None
+    return None
+
+def bmp_length(buf, start, end):
+    """
+    Validate the file and DIB headers and return the size they declare.
+    For uncompressed bitmaps the size implied by the pixel array is used when
+    the header's size field is missing or too small.
+    """
+    if start + BMP_FILE_HEADER.size + BMP_INFO_HEADER.size > end:
+        return None
+    _, file_size, pixel_offset, dib_size = BMP_FILE_HEADER.unpack_from(buf, start)
+    if buf[start + 6:start + 10] != b'\0\0\0\0' or dib_size not in BMP_DIB_SIZES:
+        return None
+    if dib_size == 12:
+        width, height, planes, bits = BMP_CORE_HEADER.unpack_from(buf, start + 18)
+        compression = 0
+    else:
+        width, height, planes, bits, compression = BMP_INFO_HEADER.unpack_from(buf, start + 18)
+    if planes != 1 or bits not in BMP_BIT_COUNTS or width <= 0 or height == 0 or compression > 6:
+        return None
+    if pixel_offset < 14 + dib_size:
+        return None
+    if compression in (0, 3, 6):  # BI_RGB, BI_BITFIELDS, BI_ALPHABITFIELDS
+        row = (width * bits + 31) // 32 * 4
+        file_size = max(file_size, pixel_offset + row * abs(height))
+    if file_size <= pixel_offset or start + file_size > end:
+        return None
+    return file_size
+
+LENGTH_PARSERS = {
+    "jpeg": jpeg_length,
+    "png": png_length,
+    "gif87": gif_length,
+    "gif89": gif_length,
+    "bmp": bmp_length,
+}
+
+def image_length(buf, start, kind, max_size):
+    """Exact length of the `kind` image at `start`, or None if it is not a complete image."""
+    end = min(len(buf), start + max_size)
+    try:
+        return LENGTH_PARSERS[kind](buf, start, end)
+    except (IndexError, struct.error):
+        return None
@@ -0,0 +1,126 @@
+# inference_worker.py — optional resident process that keeps the ML models loaded
+#
+# Start it once per workstation with `python inference_worker.py`; the GUI and
+# batch jobs send it batches through gui_logic.classify_texts whenever it is
+# running and fall back to loading the models themselves when it is not.
+
+import os
+import sys
+import secrets
+import tempfile
+import threading
+from functools import lru_cache
+from multiprocessing.connection import Listener, Client, AuthenticationError
+
+if sys.platform == "win32":
+    WORKER_FAMILY = "AF_PIPE"
+    WORKER_ADDRESS = r"\\.\pipe\forendoc_inference"
+else:
+    WORKER_FAMILY = "AF_UNIX"
+    WORKER_ADDRESS = os.path.join(tempfile.gettempdir(), f"forendoc_inference_{os.getuid()}.sock")
+WORKER_KEY_FILE = os.path.join(os.path.expanduser("~"), ".forendoc", "worker.key")
+
+@lru_cache(maxsize=None)
+def worker_authkey(path=WORKER_KEY_FILE):
+    """
+    Shared secret for the worker connection, read from a per-user key file
+    that is created with a random key and mode 0600 on first use. Requests
+    are unpickled, so only the user's own processes may ever know it.
+    FORENDOC_WORKER_KEY overrides the file.
+    """
+    if os.environ.get("FORENDOC_WORKER_KEY"):
+        return os.environ["FORENDOC_WORKER_KEY"].encode("utf-8")
+    os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    try:
+        # O_EXCL: if another process creates the file first, read its key instead
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        with open(path, "rb") as f:
+            return f.read().strip()
+    key = secrets.token_hex(32).encode("ascii")
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    return key
+
+def predict_remote(texts, version, address=WORKER_ADDRESS):
+    """
+    Classify `texts` in the resident worker.
+    Returns a list of (ml_encryption, ml_category), or None if no worker is
+    running or it serves different model files than `version`.
+    """
+    if WORKER_FAMILY == "AF_UNIX" and not os.path.exists(address):
+        return None
+    try:
+        with Client(address, family=WORKER_FAMILY, authkey=worker_authkey()) as conn:
+            conn.send(("classify", version, list(texts)))
+            status, labels = conn.recv()
+    except (OSError, EOFError, AuthenticationError):
+        return None
+    return labels if status == "ok" else None
+
+def stop_worker(address=WORKER_ADDRESS):
+    try:
+        with Client(address, family=WORKER_FAMILY, authkey=worker_authkey()) as conn:
+            conn.send(("shutdown", None, None))
+            conn.recv()
+        return True
+    except (OSError, EOFError, AuthenticationError):
+        return False
+
+def _handle(conn, stopping, address, version):
+    import gui_logic
+
+    with conn:
+        try:
+            command, client_version, payload = conn.recv()
+        except EOFError:
+            return
+        if command == "shutdown":
+            conn.send(("ok", None))
+            stopping.set()
+            # wake the accept() loop so it can notice the shutdown
+            Client(address, family=WORKER_FAMILY, authkey=worker_authkey()).close()
+        elif client_version != version:
+            # the client sees different model files on disk: let it load them itself
+            conn.send(("stale", None))
+        elif command == "classify":
+            conn.send(("ok", gui_logic.predict_local(payload)))
+        else:
+            conn.send(("error", f"Unknown command {command!r}"))
+
+def serve(address=WORKER_ADDRESS):
+    """Load both models once and answer classification requests until stopped."""
+    import gui_logic
+
+    for name in gui_logic.MODEL_FILES:
+        gui_logic.get_model(name)
+    # warm-up call so the first real request does not pay for lazy initialisation
+    gui_logic.predict_local(["warm-up"])
+    version = gui_logic.model_version()
+
+    if WORKER_FAMILY == "AF_UNIX" and os.path.exists(address):
+        os.remove(address)
+    listener = Listener(address, family=WORKER_FAMILY, authkey=worker_authkey())
+    if WORKER_FAMILY == "AF_UNIX":
+        os.chmod(address, 0o600)
+    print(f"[✓] Inference worker ready on {address}")
+
+    stopping = threading.Event()
+    try:
+        while not stopping.is_set():
+            try:
+                conn = listener.accept()
+            except (OSError, AuthenticationError):
+                continue
+            threading.Thread(target=_handle, args=(conn, stopping, address, version), daemon=True).start()
+    finally:
+        listener.close()
+        if WORKER_FAMILY == "AF_UNIX" and os.path.exists(address):
+            os.remove(address)
+    print("[✓] Inference worker stopped")
+
+if __name__ == "__main__":
+    if "--stop" in sys.argv:
+        print("[✓] Worker stopped" if stop_worker() else "[!] No worker running")
+    else:
+        serve()
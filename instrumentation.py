@@ -0,0 +1,169 @@
+# instrumentation.py — structured progress and throughput events for the carving pipeline
+#
+# Pipeline stages wrap their work in `with stage("scan", dump=...) as st:` and
+# record bytes and candidate counts on it. When the block ends a single
+# "stage_end" event is emitted with timing, MB/s and the counts, e.g.
+# {"event": "stage_end", "stage": "recover", "seconds": 3.2, "mb_per_s": 410.5,
+#  "counts": {"accepted": 12, "rejected_not_docx": 3051, ...}}.
+# Events go to every registered sink; with no sinks registered they cost
+# next to nothing, so library code can always instrument itself.
+
+import os
+import json
+import time
+import threading
+import cProfile
+import itertools
+from collections import Counter
+from contextlib import contextmanager
+
+METRICS_FILE = "pipeline_metrics.jsonl"
+
+_sinks = []
+_sinks_lock = threading.Lock()
+_profile_dir = None
+_profiling = threading.Lock()  # held while a stage is being profiled
+_profile_seq = itertools.count(1)
+
+# === Sinks ===
+class PrintSink:
+    """Print stage summaries in the same style as the rest of the pipeline."""
+
+    def __call__(self, event):
+        if event["event"] == "stage_end":
+            print(f"[i] {format_event(event)}")
+
+class JsonMetricsSink:
+    """Append every event as one JSON line to a metrics file."""
+
+    def __init__(self, path=METRICS_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def __call__(self, event):
+        line = json.dumps(event, ensure_ascii=False, default=str) + "\n"
+        with self.lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+class QueueSink:
+    """Forward events to a queue, e.g. one polled from the Tk thread."""
+
+    def __init__(self, events, kind="metric"):
+        self.events = events
+        self.kind = kind
+
+    def __call__(self, event):
+        self.events.put((self.kind, None, event))
+
+def add_sink(sink):
+    with _sinks_lock:
+        _sinks.append(sink)
+    return sink
+
+def remove_sink(sink):
+    with _sinks_lock:
+        if sink in _sinks:
+            _sinks.remove(sink)
+
+def format_event(event):
+    """One-line human readable summary of a stage_end event."""
+    text = f"{event['stage']}: {event['seconds']:.2f}s"
+    if event.get("bytes"):
+        text += f", {event['bytes'] / (1024 * 1024):.1f} MB at {event['mb_per_s']:.1f} MB/s"
+    if event.get("counts"):
+        text += ", " + ", ".join(f"{k}={v}" for k, v in sorted(event["counts"].items()))
+    return text
+
+# === Events ===
+def emit(event, **fields):
+    if not _sinks:
+        return
+    record = {"event": event, "time": time.time(), "pid": os.getpid(), **fields}
+    with _sinks_lock:
+        sinks = list(_sinks)
+    for sink in sinks:
+        try:
+            sink(record)
+        except Exception as e:
+            # a broken sink must never break the pipeline stage it observes
+            print(f"[!] Metrics sink failed: {e}")
+
+class Stage:
+    """Counters for one running pipeline stage."""
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+        self.bytes = 0
+        self.counts = Counter()
+        self.started = time.perf_counter()
+
+    def add_bytes(self, n):
+        self.bytes += int(n)
+
+    def count(self, key, n=1):
+        self.counts[key] += int(n)
+
+    def update(self, counts):
+        """Merge counts gathered elsewhere, e.g. returned by a worker process."""
+        self.counts.update(counts)
+
+    def accept(self, n=1):
+        self.count("accepted", n)
+
+    def reject(self, reason, n=1):
+        self.count(f"rejected_{reason}", n)
+
+    def summary(self):
+        seconds = time.perf_counter() - self.started
+        return {
+            "stage": self.name,
+            "seconds": round(seconds, 4),
+            "bytes": self.bytes,
+            "mb_per_s": round(self.bytes / (1024 * 1024) / seconds, 2) if seconds > 0 else 0.0,
+            "counts": dict(self.counts),
+            **self.fields,
+        }
+
+@contextmanager
+def stage(name, **fields):
+    """
+    Time a pipeline stage and emit stage_start / stage_end events for it.
+    With profiling enabled the stage also runs under cProfile and its stats
+    are written to <profile dir>/<name>_<pid>_<n>.prof.
+    """
+    st = Stage(name, fields)
+    emit("stage_start", stage=name, **fields)
+    profiler = None
+    # cProfile cannot nest, so only the outermost profiled stage is captured
+    if _profile_dir and _profiling.acquire(blocking=False):
+        profiler = cProfile.Profile()
+        profiler.enable()
+    status = "ok"
+    try:
+        yield st
+    except BaseException as e:
+        # e.g. "JobCancelled" when the GUI aborted the stage
+        status = type(e).__name__
+        raise
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            _profiling.release()
+            os.makedirs(_profile_dir, exist_ok=True)
+            profiler.dump_stats(os.path.join(_profile_dir, f"{name}_{os.getpid()}_{next(_profile_seq)}.prof"))
+        emit("stage_end", status=status, **st.summary())
+
+# === cProfile capture ===
+def enable_profiling(directory="profiles"):
+    """Profile every subsequent stage() into .prof files under `directory`."""
+    global _profile_dir
+    _profile_dir = directory
+
+def disable_profiling():
+    global _profile_dir
+    _profile_dir = None
+
+# FORENDOC_PROFILE=<dir> turns on capture without touching code
+if os.environ.get("FORENDOC_PROFILE"):
+    enable_profiling(os.environ["FORENDOC_PROFILE"])
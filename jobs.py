@@ -0,0 +1,116 @@
+# jobs.py — background pipeline jobs with progress and cancellation for the Tk GUI
+#
+# Pipeline functions take an optional `progress` callable and call it with
+# keyword counters (bytes_scanned=..., files_analyzed=...). A job's progress
+# callable posts those counters to the GUI and raises JobCancelled once the
+# user has asked to cancel, so cancellation is cooperative and the pipeline
+# modules never need to know about Tk or threads.
+
+import queue
+import threading
+
+class JobCancelled(Exception):
+    pass
+
+class Job:
+    def __init__(self, name, events):
+        self.name = name
+        self.events = events
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def progress(self, **counters):
+        """Progress callback handed to pipeline functions."""
+        if self.cancel_event.is_set():
+            raise JobCancelled(self.name)
+        self.events.put(("progress", self, counters))
+
+class JobRunner:
+    """
+    Runs one pipeline stage at a time in a worker thread and delivers its
+    events on the Tk thread by polling a queue with root.after().
+    Instrumentation events put on the same queue (see instrumentation.QueueSink)
+    are handed to on_metric.
+    """
+
+    def __init__(self, root, on_progress=None, on_metric=None, poll_ms=100):
+        self.root = root
+        self.on_progress = on_progress
+        self.on_metric = on_metric
+        self.poll_ms = poll_ms
+        self.events = queue.Queue()
+        self.current = None
+        self.callbacks = {}
+        self.root.after(self.poll_ms, self._poll)
+
+    @property
+    def busy(self):
+        return self.current is not None
+
+    def start(self, name, func, *args, on_done=None, on_error=None, on_cancel=None, **kwargs):
+        """
+        Run func(*args, progress=job.progress, **kwargs) in a worker thread.
+        on_done(result), on_error(exc) and on_cancel() are called on the Tk thread.
+        """
+        if self.busy:
+            raise RuntimeError(f"'{self.current.name}' is still running")
+        job = Job(name, self.events)
+        self.current = job
+        self.callbacks[job] = (on_done, on_error, on_cancel)
+
+        def target():
+            try:
+                result = func(*args, progress=job.progress, **kwargs)
+            except JobCancelled:
+                self.events.put(("cancelled", job, None))
+            except Exception as e:
+                self.events.put(("error", job, e))
+            else:
+                self.events.put(("done", job, result))
+
+        threading.Thread(target=target, name=f"job-{name}", daemon=True).start()
+        return job
+
+    def cancel(self):
+        if self.current is not None:
+            self.current.cancel()
+
+    def _dispatch(self, kind, job, payload):
+        if kind == "progress":
+            if self.on_progress:
+                self.on_progress(job, payload)
+            return
+        if kind == "metric":
+            if self.on_metric:
+                self.on_metric(payload)
+            return
+        on_done, on_error, on_cancel = self.callbacks.pop(job)
+        if job is self.current:
+            self.current = None
+        if kind == "done" and on_done:
+            on_done(payload)
+        elif kind == "error" and on_error:
+            on_error(payload)
+        elif kind == "cancelled" and on_cancel:
+            on_cancel()
+
+    def _poll(self):
+        try:
+            while True:
+                try:
+                    kind, job, payload = self.events.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    self._dispatch(kind, job, payload)
+                except Exception as e:
+                    # a failing GUI callback must not stop events for later jobs
+                    print(f"[!] Job event handler for '{kind}' failed: {e}")
+        finally:
+            self.root.after(self.poll_ms, self._poll)
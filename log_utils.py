@@ -1,9 +1,17 @@
 import os
+import re
+import json
+import math
+import queue
+import shutil
+import atexit
+import sqlite3
 import hashlib
+import threading
+from array import array
 from datetime import datetime
 import tkinter as tk
 from tkinter import filedialog, messagebox
-import psycopg2
 
 # === PostgreSQL connection settings ===
 DB_CONFIG = {
@@ -11,68 +19,347 @@ DB_CONFIG = {
     "user": "postgres",
     "password": "Fqpflf",
     "host": "localhost",
-    "port": "5432"
+    "port": "5432",
+    "connect_timeout": 5
 }
 
 # === Path to local log file ===
 LOG_FILE = "activity.log"
+LOG_MAX_BYTES = 50 * 1024 * 1024  # rotate activity.log once it reaches 50 MB
+LOG_BACKUP_COUNT = 5              # rotated segments kept (activity.log.1 ... .5)
+LOG_PAGE_SIZE = 500               # lines shown per page in the log viewer
+EXPORT_BUFFER_SIZE = 1024 * 1024  # bytes copied at a time when exporting
+ACTION_PATTERN = re.compile(r"^\[[^\]]*\] \[([^\]]*)\]")
+_log_file_lock = threading.Lock()
+
+# === Background DB writer settings ===
+SPOOL_FILE = "activity_spool.jsonl"  # rows waiting for the DB while it is unreachable
+LOG_BATCH_SIZE = 100                  # rows per multi-row INSERT
+LOG_FLUSH_INTERVAL = 1.0              # seconds a partial batch may wait before it is written
 
 # === Utility to hash strings using SHA-256 ===
 def hash_string(text):
     return hashlib.sha256(text.encode('utf-8')).hexdigest()
 
+# === DB backends: PostgreSQL for production, SQLite as a local stand-in for tests ===
+class PostgresBackend:
+    def __init__(self, db_config=DB_CONFIG, max_connections=2):
+        self.db_config = db_config
+        self.max_connections = max_connections
+        self.pool = None
+
+    def insert_rows(self, rows):
+        import psycopg2.pool
+        from psycopg2.extras import execute_values
+
+        if self.pool is None:
+            self.pool = psycopg2.pool.ThreadedConnectionPool(1, self.max_connections, **self.db_config)
+        conn = self.pool.getconn()
+        try:
+            with conn.cursor() as cur:
+                # Set timezone to Kazakhstan
+                cur.execute("SET TIME ZONE 'Asia/Almaty';")
+                execute_values(cur, """
+                    INSERT INTO logs (timestamp, action_type, filename, details, operator)
+                    VALUES %s
+                """, rows, template="(%s::timestamptz, %s, %s, %s, %s)")
+            conn.commit()
+            self.pool.putconn(conn)
+        except Exception:
+            # drop the connection: it may be the reason the insert failed
+            self.pool.putconn(conn, close=True)
+            raise
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.closeall()
+            self.pool = None
+
+class SQLiteBackend:
+    def __init__(self, path="activity_log.sqlite"):
+        self.path = path
+        with sqlite3.connect(path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS logs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    timestamp TEXT, action_type TEXT, filename TEXT, details TEXT, operator TEXT
+                )
+            """)
+        conn.close()
+
+    def insert_rows(self, rows):
+        conn = sqlite3.connect(self.path)
+        try:
+            with conn:
+                conn.executemany("""
+                    INSERT INTO logs (timestamp, action_type, filename, details, operator)
+                    VALUES (?, ?, ?, ?, ?)
+                """, rows)
+        finally:
+            conn.close()
+
+    def close(self):
+        pass
+
+# === Background writer: batches rows, spools them to disk while the DB is down ===
+class AuditLogWriter:
+    def __init__(self, backend, spool_path=SPOOL_FILE, batch_size=LOG_BATCH_SIZE,
+                 flush_interval=LOG_FLUSH_INTERVAL):
+        self.backend = backend
+        self.spool_path = spool_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="audit-log-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, row):
+        self.queue.put(row)
+
+    def flush(self, timeout=None):
+        """Block until every row submitted so far is in the DB or the spool."""
+        done = threading.Event()
+        self.queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=10):
+        self.flush(timeout)
+        self.queue.put(None)
+        self.thread.join(timeout)
+        self.backend.close()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            rows, waiters = [], []
+            # collect a batch: everything already queued, up to batch_size rows
+            while True:
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                elif item is not None:
+                    rows.append(item)
+                if item is None or len(rows) >= self.batch_size:
+                    break
+                try:
+                    item = self.queue.get(timeout=0 if waiters else self.flush_interval)
+                except queue.Empty:
+                    break
+            if rows:
+                self._write(rows)
+            for waiter in waiters:
+                waiter.set()
+            if item is None:
+                return
+
+    def _write(self, rows):
+        try:
+            self._replay_spool()
+            self.backend.insert_rows(rows)
+        except Exception as e:
+            print(f"[DB error] {e} — spooling {len(rows)} log rows to {self.spool_path}")
+            self._spool(rows)
+
+    def _spool(self, rows):
+        with open(self.spool_path, "a", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+    def _replay_spool(self):
+        if not os.path.exists(self.spool_path):
+            return
+        with open(self.spool_path, "r", encoding="utf-8") as f:
+            rows = [tuple(json.loads(line)) for line in f if line.strip()]
+        for i in range(0, len(rows), self.batch_size):
+            try:
+                self.backend.insert_rows(rows[i:i + self.batch_size])
+            except Exception:
+                # keep only what is still missing, so nothing is inserted twice
+                tmp_path = self.spool_path + ".tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    for row in rows[i:]:
+                        f.write(json.dumps(row, ensure_ascii=False) + "\n")
+                os.replace(tmp_path, self.spool_path)
+                raise
+        os.remove(self.spool_path)
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def configure_log_backend(backend, **writer_options):
+    """Replace the DB backend (e.g. SQLiteBackend in tests); pending rows are flushed first."""
+    global _writer
+    with _writer_lock:
+        if _writer is not None:
+            _writer.close()
+        _writer = AuditLogWriter(backend, **writer_options)
+    return _writer
+
+def get_log_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = AuditLogWriter(PostgresBackend())
+    return _writer
+
+def flush_logs(timeout=10):
+    """Wait until queued audit rows are written to the DB (or spooled). Called at exit."""
+    if _writer is not None:
+        return _writer.flush(timeout)
+    return True
+
+atexit.register(flush_logs)
+
+# === Size-based rotation and line-offset index of the local log ===
+def _index_path(log_path):
+    return log_path + ".idx"
+
+def log_files(log_path=LOG_FILE):
+    """Existing log segments, oldest first (activity.log.N ... activity.log)."""
+    rotated = [f"{log_path}.{i}" for i in range(LOG_BACKUP_COUNT, 0, -1)]
+    return [path for path in rotated + [log_path] if os.path.exists(path)]
+
+def _rotate_logs(log_path=LOG_FILE):
+    names = [log_path] + [f"{log_path}.{i}" for i in range(1, LOG_BACKUP_COUNT + 1)]
+    # shift activity.log.N-1 -> .N, ..., activity.log -> .1, each with its index
+    for src, dst in reversed(list(zip(names, names[1:]))):
+        for src_path, dst_path in ((src, dst), (_index_path(src), _index_path(dst))):
+            if os.path.exists(src_path):
+                os.replace(src_path, dst_path)
+
+def build_log_index(log_path=LOG_FILE):
+    """Scan a log once and write the byte offset of every line start (uint64)."""
+    offsets = array("Q")
+    with open(log_path, "rb") as f:
+        offset = 0
+        for line in f:
+            offsets.append(offset)
+            offset += len(line)
+    with open(_index_path(log_path), "wb") as idx:
+        offsets.tofile(idx)
+    return offsets
+
+def load_log_index(log_path=LOG_FILE):
+    """Line offsets of `log_path`, rebuilt if the index is missing or out of date."""
+    idx_path = _index_path(log_path)
+    if os.path.exists(idx_path):
+        offsets = array("Q")
+        with open(idx_path, "rb") as idx:
+            offsets.frombytes(idx.read())
+        size = os.path.getsize(log_path)
+        if not offsets:
+            if size == 0:
+                return offsets
+        elif offsets[-1] < size:
+            # in sync if exactly one line follows the last indexed offset
+            with open(log_path, "rb") as f:
+                f.seek(offsets[-1])
+                tail = f.read()
+            if tail.count(b"\n") == 1 and tail.endswith(b"\n"):
+                return offsets
+    return build_log_index(log_path)
+
 # === Write a structured log entry ===
 def write_log(details, action_type="generic", filename=None, operator="local"):
-    timestamp = datetime.now().strftime("[%Y-%m-%d %H:%M:%S]")
+    now = datetime.now().astimezone()
+    timestamp = now.strftime("[%Y-%m-%d %H:%M:%S]")
     log_entry = f"{timestamp} [{action_type}] {filename or ''} - {details}\n"
 
-    # Save to local plain text file
-    with open(LOG_FILE, "a", encoding="utf-8") as f:
-        f.write(log_entry)
+    # Save to local plain text file, rotating by size and indexing each line start
+    with _log_file_lock:
+        if os.path.exists(LOG_FILE) and os.path.getsize(LOG_FILE) >= LOG_MAX_BYTES:
+            _rotate_logs(LOG_FILE)
+        if os.path.exists(LOG_FILE) and not os.path.exists(_index_path(LOG_FILE)):
+            build_log_index(LOG_FILE)
+        with open(LOG_FILE, "ab") as f, open(_index_path(LOG_FILE), "ab") as idx:
+            array("Q", [f.tell()]).tofile(idx)
+            f.write(log_entry.encode("utf-8"))
 
-    # Save to PostgreSQL (hashed fields, correct timezone)
+    # Queue for PostgreSQL (hashed fields, event time with timezone); never blocks the caller
     hashed_operator = hash_string(operator)
     hashed_filename = hash_string(filename) if filename else None
+    get_log_writer().submit((now.isoformat(), action_type, hashed_filename, details, hashed_operator))
 
-    try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        cur = conn.cursor()
+def _line_action(line):
+    match = ACTION_PATTERN.match(line)
+    return match.group(1) if match else None
 
-        # Set timezone to Kazakhstan
-        cur.execute("SET TIME ZONE 'Asia/Almaty';")
+def filtered_log_offsets(log_path=LOG_FILE, action_type=None):
+    """Line offsets of `log_path`, optionally only lines of one action_type (one streaming pass)."""
+    if not action_type:
+        return load_log_index(log_path)
+    offsets = array("Q")
+    with open(log_path, "rb") as f:
+        offset = 0
+        for line in f:
+            if _line_action(line.decode("utf-8", errors="replace")) == action_type:
+                offsets.append(offset)
+            offset += len(line)
+    return offsets
 
-        cur.execute("""
-            INSERT INTO logs (timestamp, action_type, filename, details, operator)
-            VALUES (NOW(), %s, %s, %s, %s)
-        """, (action_type, hashed_filename, details, hashed_operator))
-
-        conn.commit()
-        cur.close()
-        conn.close()
-    except Exception as e:
-        print(f"[DB error] {e}")
+def read_log_lines(log_path, offsets, first, count):
+    """Decode `count` lines starting at entry `first` of an offset list."""
+    lines = []
+    with open(log_path, "rb") as f:
+        for offset in offsets[first:first + count]:
+            f.seek(offset)
+            lines.append(f.readline().decode("utf-8", errors="replace"))
+    return lines
 
-# === GUI Log Viewer ===
+# === GUI Log Viewer (paged; only one page of lines is ever loaded) ===
 def show_log_window():
-    if not os.path.exists(LOG_FILE):
+    files = log_files(LOG_FILE)
+    if not files:
         messagebox.showerror("Error", "No logs found")
         return
 
     log_window = tk.Toplevel()
     log_window.title("Log Viewer")
-    log_window.geometry("600x400")
+    log_window.geometry("700x450")
     log_window.configure(bg="#2a2a3d")
 
-    with open(LOG_FILE, "r", encoding="utf-8") as f:
-        content = f.read()
+    state = {"offsets": array("Q"), "page": 0}
+    file_var = tk.StringVar(value=files[-1])
+    action_var = tk.StringVar()
+    page_label = tk.StringVar()
+
+    controls = tk.Frame(log_window, bg="#2a2a3d")
+    controls.pack(fill="x")
+    tk.OptionMenu(controls, file_var, *files, command=lambda _: reload()).pack(side=tk.LEFT, padx=2)
+    tk.Label(controls, text="action_type:", bg="#2a2a3d", fg="white").pack(side=tk.LEFT)
+    action_entry = tk.Entry(controls, textvariable=action_var, width=18)
+    action_entry.pack(side=tk.LEFT, padx=2)
+    action_entry.bind("<Return>", lambda _: reload())
+    tk.Button(controls, text="Filter", command=lambda: reload()).pack(side=tk.LEFT, padx=2)
+    tk.Button(controls, text="< Prev", command=lambda: show_page(state["page"] - 1)).pack(side=tk.LEFT, padx=2)
+    tk.Button(controls, text="Next >", command=lambda: show_page(state["page"] + 1)).pack(side=tk.LEFT, padx=2)
+    tk.Label(controls, textvariable=page_label, bg="#2a2a3d", fg="white").pack(side=tk.LEFT, padx=5)
 
     text_box = tk.Text(log_window, bg="#2a2a3d", fg="white", wrap="word")
-    text_box.insert(tk.END, content)
     text_box.pack(expand=True, fill="both")
 
+    def show_page(page):
+        pages = max(1, math.ceil(len(state["offsets"]) / LOG_PAGE_SIZE))
+        state["page"] = min(max(page, 0), pages - 1)
+        lines = read_log_lines(file_var.get(), state["offsets"], state["page"] * LOG_PAGE_SIZE, LOG_PAGE_SIZE)
+        text_box.config(state="normal")
+        text_box.delete("1.0", tk.END)
+        text_box.insert(tk.END, "".join(lines))
+        text_box.config(state="disabled")
+        page_label.set(f"Page {state['page'] + 1}/{pages} ({len(state['offsets'])} lines)")
+
+    def reload():
+        state["offsets"] = filtered_log_offsets(file_var.get(), action_var.get().strip())
+        # newest entries first: open on the last page
+        show_page(len(state["offsets"]) // LOG_PAGE_SIZE)
+
+    reload()
+
 # === Export log to file ===
 def export_log():
-    if not os.path.exists(LOG_FILE):
+    files = log_files(LOG_FILE)
+    if not files:
         messagebox.showerror("Error", "No logs to export")
         return
 
@@ -82,8 +369,9 @@ def export_log():
         filetypes=[("Text Files", "*.txt")]
     )
     if save_path:
-        with open(LOG_FILE, "r", encoding="utf-8") as f:
-            content = f.read()
-        with open(save_path, "w", encoding="utf-8") as out:
-            out.write(content)
+        # all segments, oldest first, copied through a bounded buffer
+        with open(save_path, "wb") as out:
+            for path in files:
+                with open(path, "rb") as f:
+                    shutil.copyfileobj(f, out, EXPORT_BUFFER_SIZE)
         messagebox.showinfo("Success", f"Logs exported to: {save_path}")
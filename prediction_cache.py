@@ -0,0 +1,56 @@
+# prediction_cache.py — persistent ML predictions keyed by content hash and model version
+
+import sqlite3
+
+PREDICTION_CACHE = "ml_predictions.sqlite"
+
+class PredictionCache:
+    """
+    (digest, model_version) -> (ml_encryption, ml_category) kept in SQLite,
+    so re-running classification only pays for documents not seen before.
+    Pass path=None for a throwaway in-memory cache.
+    """
+
+    def __init__(self, path=PREDICTION_CACHE):
+        self.conn = sqlite3.connect(path or ":memory:", timeout=60)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS predictions (
+                digest BLOB,
+                model_version TEXT,
+                ml_encryption TEXT,
+                ml_category TEXT,
+                PRIMARY KEY (digest, model_version)
+            ) WITHOUT ROWID
+        """)
+
+    def get_many(self, digests, model_version):
+        """Return {digest: (ml_encryption, ml_category)} for the cached digests."""
+        found = {}
+        digests = list(set(digests))
+        # stay under SQLite's bound-parameter limit
+        for i in range(0, len(digests), 500):
+            chunk = digests[i:i + 500]
+            rows = self.conn.execute(
+                f"SELECT digest, ml_encryption, ml_category FROM predictions "
+                f"WHERE model_version = ? AND digest IN ({','.join('?' * len(chunk))})",
+                [model_version, *chunk],
+            )
+            found.update((digest, (enc, cat)) for digest, enc, cat in rows)
+        return found
+
+    def put_many(self, rows, model_version):
+        """Store (digest, ml_encryption, ml_category) rows."""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?)",
+                [(digest, model_version, enc, cat) for digest, enc, cat in rows],
+            )
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
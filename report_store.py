@@ -0,0 +1,74 @@
+# report_store.py — append-only JSON Lines backend for the forensic report
+
+import os
+import json
+
+REPORT_FILE = "forensic_report.jsonl"
+JSON_EXPORT = "forensic_report.json"
+
+def reset_report(path=REPORT_FILE):
+    """Start an empty report (a new analysis run replaces the previous one)."""
+    open(path, "w", encoding="utf-8").close()
+
+def append_records(records, path=REPORT_FILE):
+    """
+    Append (name, fields) pairs, one JSON line each. Records may come from a
+    generator; each line is flushed as it is written, so readers see
+    results as they finish and a crash loses at most one record.
+    Later records for the same name add or override fields of earlier ones.
+    """
+    count = 0
+    with open(path, "a", encoding="utf-8") as f:
+        for name, fields in records:
+            f.write(json.dumps({"name": name, "fields": fields}, ensure_ascii=False) + "\n")
+            f.flush()
+            count += 1
+    return count
+
+def iter_raw_records(path=REPORT_FILE):
+    """Yield (name, fields) for every stored line, unmerged and in write order."""
+    if path.endswith(".json"):
+        # legacy single-document report
+        with open(path, "r", encoding="utf-8") as f:
+            yield from json.load(f).items()
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                yield record["name"], record["fields"]
+
+def load_report(path=REPORT_FILE, fields=None, names=None):
+    """
+    Merge the stored records into {name: {field: value}}.
+    `fields` and `names` restrict what is kept, so querying one column of a
+    large report does not hold every extracted text in memory.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{path} not found")
+
+    report = {}
+    for name, record_fields in iter_raw_records(path):
+        if names is not None and name not in names:
+            continue
+        entry = report.setdefault(name, {})
+        if fields is None:
+            entry.update(record_fields)
+        else:
+            entry.update((k, v) for k, v in record_fields.items() if k in fields)
+    return report
+
+def compact_report(path=REPORT_FILE):
+    """Rewrite the report with one merged line per name."""
+    report = load_report(path)
+    tmp_path = path + ".tmp"
+    reset_report(tmp_path)
+    append_records(report.items(), tmp_path)
+    os.replace(tmp_path, path)
+
+def export_json(path=REPORT_FILE, json_path=JSON_EXPORT):
+    """Write the merged report as the classic single forensic_report.json document."""
+    report = load_report(path)
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    return json_path
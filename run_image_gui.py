@@ -17,5 +17,6 @@ def gui():
     count = recover_images_from_dump(path)
     messagebox.showinfo("Result", f"Recovered {count} image(s) from the dump.")
 
-# Start the simple GUI
-gui()
+# Start the simple GUI (guarded: carving workers re-import this module on spawn platforms)
+if __name__ == "__main__":
+    gui()
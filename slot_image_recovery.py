@@ -1,7 +1,17 @@
 # slot_image_recovery.py
 
 import os
+import mmap
 import zipfile
+import numpy as np
+from utils import pool_map, worker_count
+from slot_scanner import scan_signatures
+from image_format import IMAGE_SIGNATURES, EXTENSIONS, image_length
+from dedup_store import DedupStore, content_digest
+from instrumentation import stage
+
+MAX_IMAGE_SIZE = 64 * 1024 * 1024  # 64 MB, largest image carved from a dump
+MEASURE_BATCH = 4096  # candidate headers parsed per worker task
 
 def extract_images(docx_path, output_folder="recovered_images"):
     """
@@ -48,3 +58,81 @@ def extract_images_from_all_docx(docx_folder="recovered_docs_from_fragment", out
             count += 1
 
     print(f"[✓] Extracted images from {count} .docx files into '{output_folder}'")
+
+
+# === Carving straight from a raw dump ===
+def _measure_images(args):
+    """
+    Worker function: parse every candidate header in a batch and return the
+    (offset, length, kind) of those that are complete images, plus the
+    number rejected.
+    """
+    dump_path, offsets, codes, kinds, max_image_size = args
+    found, rejected = [], 0
+    with open(dump_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for offset, code in zip(offsets.tolist(), codes.tolist()):
+            length = image_length(mm, offset, kinds[code], max_image_size)
+            if length:
+                found.append((offset, length, kinds[code]))
+            else:
+                rejected += 1
+    return found, rejected
+
+def recover_images_from_dump(dump_path, output_folder="recovered_images", dedup_path=None,
+                             num_workers=None, max_image_size=MAX_IMAGE_SIZE, progress=None):
+    """
+    Carve JPEG, PNG, GIF and BMP images straight from a raw dump.
+    Headers are found with the parallel mmap signature scan, then each one is
+    parsed (JPEG markers, PNG chunks, GIF blocks, BMP headers) to get the
+    image's exact length. Images lying inside an already carved image (e.g.
+    EXIF thumbnails) and repeated content are skipped.
+    Returns the number of images written.
+    """
+    if os.path.getsize(dump_path) == 0:
+        return 0
+    os.makedirs(output_folder, exist_ok=True)
+    num_workers = num_workers or worker_count()
+
+    index, _ = scan_signatures(dump_path, IMAGE_SIGNATURES, num_workers, progress)
+    kinds = list(index)
+    offsets = np.concatenate([index[kind] for kind in kinds])
+    codes = np.concatenate([np.full(len(index[kind]), i, dtype=np.uint8) for i, kind in enumerate(kinds)])
+    order = np.argsort(offsets, kind="stable")
+    offsets, codes = offsets[order], codes[order]
+    tasks = [
+        (dump_path, offsets[i:i + MEASURE_BATCH], codes[i:i + MEASURE_BATCH], kinds, max_image_size)
+        for i in range(0, len(offsets), MEASURE_BATCH)
+    ]
+
+    done = {"checked": 0, "images": 0, "covered_end": 0}
+    with open(dump_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, \
+            DedupStore(dedup_path) as seen, \
+            stage("carve_images", dump=os.path.basename(dump_path), workers=num_workers) as st:
+        def on_result(result):
+            found, rejected = result
+            st.reject("invalid", rejected)
+            # batches arrive in offset order, so nesting is judged across batches too
+            for offset, length, kind in found:
+                if offset < done["covered_end"]:
+                    st.reject("nested")
+                    continue
+                done["covered_end"] = offset + length
+                data = mm[offset:offset + length]
+                if not seen.add(content_digest(data)):
+                    st.reject("duplicate")
+                    continue
+                output_path = os.path.join(output_folder, f"carved_{offset:012x}{EXTENSIONS[kind]}")
+                with open(output_path, "wb") as out:
+                    out.write(data)
+                st.accept()
+                st.add_bytes(length)
+                done["images"] += 1
+            done["checked"] += len(found) + rejected
+            if progress:
+                progress(candidates_checked=done["checked"], total_candidates=len(offsets),
+                         images=done["images"])
+
+        pool_map(_measure_images, tasks, num_workers, on_result)
+
+    print(f"[✓] Carved {done['images']} image(s) from '{dump_path}' into '{output_folder}'")
+    return done["images"]
@@ -1,75 +1,377 @@
 import os
+import json
+import math
+import mmap
+import tempfile
 import zipfile
+from collections import Counter
+from contextlib import contextmanager
 from io import BytesIO
 import hashlib
-from xml.etree import ElementTree
+from utils import DOCX_END, pool_map, worker_count
+from docx_format import zip_extents, find_all, probe_docx, iter_docx_text, ZIP_ERRORS
+from dedup_store import DedupStore, DEDUP_DB, content_digest
+from instrumentation import stage
+from checkpoint import Checkpoint, source_fingerprint
 
 DOCX_SIGNATURE = b'PK\x03\x04'
 OUTPUT_DIR = "recovered_docs_from_fragment"
-MAX_DOCX_SIZE = 800 * 1024  # 800 KB
+MAX_DOCX_SIZE = 800 * 1024  # 800 KB, fallback window for archives without a matching EOCD
 MAX_DOCX_TOTAL = 20  # recover only last 20 real unique .docx
+MAX_ARCHIVE_SIZE = 64 * 1024 * 1024  # 64 MB, largest exact archive held in memory at once
+PROGRESS_INTERVAL = 64 * 1024 * 1024  # report scan position every 64 MB of candidates
 
 def get_sha1(data):
     return hashlib.sha1(data).hexdigest()
 
+def extract_text_from_zip(zf):
+    """Return the text of word/document.xml from an open ZipFile, or None."""
+    try:
+        return " ".join(iter_docx_text(zf)).strip()
+    except ZIP_ERRORS:
+        return None
+
 def extract_text_from_docx_bytes(data):
     try:
         with zipfile.ZipFile(BytesIO(data)) as zf:
-            if "word/document.xml" not in zf.namelist():
-                return None
-            xml_data = zf.read("word/document.xml")
-            tree = ElementTree.fromstring(xml_data)
-            paragraphs = tree.findall(
-                ".//w:t",
-                namespaces={'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'}
-            )
-            full_text = " ".join([p.text for p in paragraphs if p.text])
-            return full_text.strip()
-    except:
+            return extract_text_from_zip(zf)
+    except ZIP_ERRORS:
         return None
 
 def is_valid_docx(chunk):
-    try:
-        with zipfile.ZipFile(BytesIO(chunk)) as zf:
-            names = zf.namelist()
-            return "word/document.xml" in names or "EncryptedPackage" in names
-    except:
-        return False
-
-def recover_docx_from_fragment(fragment_path, output_dir=OUTPUT_DIR):
-    os.makedirs(output_dir, exist_ok=True)
-
-    with open(fragment_path, "rb") as f:
-        data = f.read()
+    return probe_docx(chunk) is not None
 
-    recovered = []
-    seen_texts = set()
-    offset = 0
-    count = 0
+def _iter_range(data, start, end, seen, max_archive_size=MAX_ARCHIVE_SIZE, progress=None, stats=None):
+    """
+    Yield (offset, bytes, digests) of each valid .docx in data[start:end] that is
+    not yet in the DedupStore `seen`. Archives already in the store are
+    skipped by content hash before any XML parsing; new ones are also
+    deduplicated by the hash of their text. The caller adds `digests` to
+    `seen` once the document is safely written, before asking for the next
+    one, so a crash in between never marks an unwritten document as seen.
+    `data` may be bytes or a read-only mmap of the dump; candidates are
+    located with data.find, so at most one archive is copied at a time.
+    `progress`, if given, is called with offset/candidates every PROGRESS_INTERVAL bytes.
+    Accepted and rejected candidates (by reason) are counted into the Counter `stats`.
+    """
+    stats = Counter() if stats is None else stats
+    # exact archive extents inside the range, keyed by start offset
+    extents = {
+        s: e for s, e in zip_extents(data, find_all(data, DOCX_END, start, end))
+        if s >= start and e <= end
+    }
 
-    while offset < len(data) and count < MAX_DOCX_TOTAL:
-        sig_index = data.find(DOCX_SIGNATURE, offset)
+    offset = start
+    candidates = 0
+    next_report = start
+    while offset < end:
+        sig_index = data.find(DOCX_SIGNATURE, offset, end)
         if sig_index == -1:
             break
 
-        chunk = data[sig_index:sig_index + MAX_DOCX_SIZE]
+        candidates += 1
+        if progress and sig_index >= next_report:
+            progress(offset=sig_index, candidates=candidates)
+            next_report = sig_index + PROGRESS_INTERVAL
 
-        if not is_valid_docx(chunk):
-            offset = sig_index + 4
+        archive_end = extents.get(sig_index)
+        if archive_end is not None:
+            # interior local headers belong to this archive: never retry them
+            chunk_end = next_offset = archive_end
+            if archive_end - sig_index > max_archive_size:
+                print(f"[!] Skipping {archive_end - sig_index} byte archive at offset {sig_index}: over size limit.")
+                stats["rejected_oversize"] += 1
+                offset = next_offset
+                continue
+        else:
+            chunk_end = min(sig_index + MAX_DOCX_SIZE, end)
+            next_offset = sig_index + 4
+
+        # reject in place, before anything is copied; encrypted packages have no text to recover
+        kind = probe_docx(data, sig_index, chunk_end)
+        if kind != "docx":
+            stats["rejected_encrypted" if kind == "encrypted" else "rejected_not_docx"] += 1
+            offset = next_offset
             continue
 
-        text = extract_text_from_docx_bytes(chunk)
-        if not text or text.strip() in seen_texts:
-            offset = sig_index + 4
+        chunk = data[sig_index:chunk_end]
+        chunk_digest = content_digest(chunk)
+        if chunk_digest in seen:
+            stats["rejected_duplicate"] += 1
+            offset = next_offset
             continue
 
-        out_path = os.path.join(output_dir, f"recovered_{count + 1}.docx")
-        with open(out_path, "wb") as out:
-            out.write(chunk)
+        text = extract_text_from_docx_bytes(chunk)
+        text_digest = content_digest(text) if text else None
+        if not text or text_digest in seen:
+            # nothing is written for a rejected archive, so it can be marked seen right away
+            seen.add(chunk_digest)
+            stats["rejected_no_text" if not text else "rejected_duplicate_text"] += 1
+            offset = next_offset
+            continue
 
-        recovered.append(out_path)
-        seen_texts.add(text.strip())
-        count += 1
+        stats["accepted"] += 1
+        yield sig_index, chunk, (chunk_digest, text_digest)
         offset = sig_index + len(chunk)
 
-    return recovered
+def _load_source(source_path):
+    """
+    Resolve a fragment file or a slot_scanner manifest (.json) into the file
+    to map and the list of (start, end) ranges to carve from it.
+    """
+    if source_path.endswith(".json"):
+        with open(source_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        data_path = manifest["dump_path"]
+        size = os.path.getsize(data_path)
+        return data_path, [(offset, min(offset + length, size)) for offset, length in manifest["ranges"]]
+    return source_path, [(0, os.path.getsize(source_path))]
+
+@contextmanager
+def _map_readonly(data_path):
+    if os.path.getsize(data_path) == 0:
+        yield b""
+        return
+    with open(data_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        yield mm
+
+def _source_tag(data_path):
+    """
+    File name stem for documents recovered from `data_path`. The short content
+    fingerprint keeps two sources apart even when they share a name or path,
+    e.g. fragments/fragment_part1.bin re-extracted from a different dump.
+    """
+    stem = os.path.splitext(os.path.basename(data_path))[0]
+    return f"{stem}_{source_fingerprint(data_path)[:8]}"
+
+def _output_path(output_dir, tag, offset):
+    # named by source and offset, so parallel runs can never clobber each other
+    return os.path.join(output_dir, f"recovered_{tag}_{offset:012x}.docx")
+
+def _write_recovered(data_path, ranges, tag, output_dir, seen, max_archive_size, progress=None, stats=None,
+                     checkpoint=None):
+    """
+    Carve every range and yield the paths written. Each document is written
+    and synced, then journalled, and only then claimed in the dedup store;
+    a worker that loses the claim to another one removes its copy again.
+    With a Checkpoint, outputs (with their digests), finished ranges and the
+    scan position inside long ranges are journalled; on resume the recorded
+    outputs are yielded again, their digests are restored to the store and
+    scanning continues from the last recorded position.
+    """
+    stats = Counter() if stats is None else stats
+    done_ranges, positions = set(), {}
+    if checkpoint is not None:
+        for record in checkpoint.items("output"):
+            # a crash may have come between the journal line and the store update
+            for digest in record["digests"]:
+                seen.add(bytes.fromhex(digest))
+            if os.path.exists(record["path"]):
+                yield record["path"]
+        done_ranges = {record["range"] for record in checkpoint.items("range_done")}
+        positions = {record["range"]: record["offset"] for record in checkpoint.items("position")}
+
+    with _map_readonly(data_path) as data:
+        for i, (start, end) in enumerate(ranges):
+            if i in done_ranges:
+                continue
+            range_progress = progress
+            if checkpoint is not None:
+                def range_progress(i=i, **counters):
+                    # reported before the candidate at `offset` is examined: a safe restart point
+                    if "offset" in counters:
+                        checkpoint.record("position", range=i, offset=counters["offset"])
+                    if progress:
+                        progress(**counters)
+
+            for offset, chunk, digests in _iter_range(data, positions.get(i, start), end, seen,
+                                                      max_archive_size, range_progress, stats):
+                out_path = _output_path(output_dir, tag, offset)
+                with open(out_path, "wb") as out:
+                    out.write(chunk)
+                    if checkpoint is not None:
+                        out.flush()
+                        os.fsync(out.fileno())
+                if checkpoint is not None:
+                    checkpoint.record("output", path=out_path, digests=[d.hex() for d in digests])
+                claimed = [seen.add(digest) for digest in digests]
+                if not claimed[-1]:
+                    # another worker recovered the same document in the meantime
+                    os.remove(out_path)
+                    stats["accepted"] -= 1
+                    stats["rejected_duplicate_text"] += 1
+                    continue
+                yield out_path
+            if checkpoint is not None:
+                checkpoint.record("range_done", range=i)
+
+def _ranges_digest(ranges):
+    return hashlib.sha1(json.dumps(ranges).encode("ascii")).hexdigest()
+
+def iter_recover_docx(source_path, output_dir=OUTPUT_DIR, max_docs=None, max_archive_size=MAX_ARCHIVE_SIZE,
+                      dedup_path=DEDUP_DB, progress=None, checkpoint_path=None):
+    """
+    Recover .docx files from a fragment file or a manifest (.json), yielding
+    each output path as soon as it is written. Peak memory is bounded by
+    max_archive_size regardless of the size of the source.
+    Documents recorded in the persistent dedup store at `dedup_path` by any
+    earlier run are skipped; dedup_path=None deduplicates within this run only.
+    `progress` receives the scan position and the running `recovered` count.
+    With `checkpoint_path`, an interrupted run resumes where it stopped and
+    re-yields what it had already recovered; the checkpoint is removed once
+    the whole source has been processed.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    data_path, ranges = _load_source(source_path)
+    tag = _source_tag(data_path)
+    checkpoint = None
+    if checkpoint_path:
+        checkpoint = Checkpoint(checkpoint_path, sorted({source_path, data_path}), {
+            "ranges": _ranges_digest(ranges), "output_dir": os.path.abspath(output_dir),
+            "max_archive_size": max_archive_size,
+            "dedup_path": dedup_path and os.path.abspath(dedup_path),
+        })
+        if dedup_path is None:
+            # a run-local store must survive the interruption too
+            os.makedirs(checkpoint.data_dir, exist_ok=True)
+            dedup_path = os.path.join(checkpoint.data_dir, "dedup.sqlite")
+
+    finished = False
+    with stage("recover", source=os.path.basename(source_path)) as st:
+        try:
+            with DedupStore(dedup_path) as seen:
+                st.add_bytes(sum(end - start for start, end in ranges))
+                recovered = _write_recovered(data_path, ranges, tag, output_dir, seen, max_archive_size,
+                                             progress, st.counts, checkpoint)
+                for count, out_path in enumerate(recovered, start=1):
+                    if progress:
+                        progress(recovered=count)
+                    yield out_path
+                    if max_docs is not None and count >= max_docs:
+                        return
+            finished = True
+        finally:
+            if checkpoint is not None:
+                checkpoint.close()
+    if finished and checkpoint is not None:
+        checkpoint.discard()
+
+def _recover_task(args):
+    """
+    Worker function: recover a list of ranges from one source into output_dir,
+    deduplicating against the shared on-disk store.
+    """
+    data_path, ranges, tag, output_dir, dedup_path, max_archive_size, task_checkpoint = args
+    stats = Counter()
+    checkpoint = None
+    if task_checkpoint:
+        checkpoint = Checkpoint(task_checkpoint, [data_path], {"ranges": _ranges_digest(ranges)})
+    try:
+        with DedupStore(dedup_path) as seen:
+            paths = list(_write_recovered(data_path, ranges, tag, output_dir, seen, max_archive_size,
+                                          stats=stats, checkpoint=checkpoint))
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
+    return paths, stats
+
+def recover_docx_parallel(sources, output_dir=OUTPUT_DIR, dedup_path=DEDUP_DB, num_workers=None,
+                          max_archive_size=MAX_ARCHIVE_SIZE, progress=None, checkpoint_path=None):
+    """
+    Recover from many fragment files and/or manifests at once over a process pool.
+    Output files are named by source and offset, duplicates are removed
+    globally through the shared dedup store, and the merged list of
+    recovered paths is returned sorted.
+    `progress` is called with tasks_done/total_tasks/recovered as tasks finish.
+    With `checkpoint_path`, finished tasks are journalled and every task keeps
+    its own journal of outputs and scan position, so a restarted run skips
+    finished tasks and resumes the others where they stopped.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    num_workers = num_workers or worker_count()
+
+    tags = {}
+    tasks = []
+    for source_path in sources:
+        data_path, ranges = _load_source(source_path)
+        if data_path not in tags:
+            tag = _source_tag(data_path)
+            # identical copies of one source still get distinct names within a run
+            tags[data_path] = tag if tag not in tags.values() else f"{tag}_{len(tags)}"
+        # split long manifests so a single dump keeps every worker busy
+        chunk_size = max(1, math.ceil(len(ranges) / num_workers))
+        for i in range(0, len(ranges), chunk_size):
+            tasks.append((data_path, ranges[i:i + chunk_size], tags[data_path]))
+    if not tasks:
+        return []
+
+    checkpoint = None
+    tasks_done = {}
+    if checkpoint_path:
+        checkpoint = Checkpoint(checkpoint_path, sorted(set(sources) | set(tags)), {
+            "tasks": _ranges_digest([[task[0], task[1]] for task in tasks]),
+            "output_dir": os.path.abspath(output_dir), "max_archive_size": max_archive_size,
+            "dedup_path": dedup_path and os.path.abspath(dedup_path),
+        })
+        os.makedirs(checkpoint.data_dir, exist_ok=True)
+        tasks_done = {record["task"]: record["paths"] for record in checkpoint.items("task")}
+
+    # workers need a file to share, even when no persistent store is wanted
+    temp_store = None
+    if dedup_path is None and checkpoint is not None:
+        # kept with the checkpoint so that a resumed run still deduplicates
+        dedup_path = os.path.join(checkpoint.data_dir, "dedup.sqlite")
+    elif dedup_path is None:
+        fd, temp_store = tempfile.mkstemp(suffix=".sqlite", dir=output_dir)
+        os.close(fd)
+        dedup_path = temp_store
+    # create the schema once, before workers race to open the store
+    DedupStore(dedup_path).close()
+
+    todo = [
+        (i, task + (output_dir, dedup_path, max_archive_size,
+                    checkpoint and os.path.join(checkpoint.data_dir, f"task{i}.jsonl")))
+        for i, task in enumerate(tasks) if i not in tasks_done
+    ]
+    pending = iter(todo)
+    results = list(tasks_done.values())
+    done = {"tasks": len(tasks_done), "recovered": sum(map(len, results))}
+    try:
+        with stage("recover", sources=len(sources), workers=min(num_workers, max(1, len(todo)))) as st:
+            st.add_bytes(sum(end - start for _, task in todo for start, end in task[1]))
+
+            def on_result(result):
+                paths, stats = result
+                index = next(pending)[0]  # results arrive in task order
+                if checkpoint is not None:
+                    checkpoint.record("task", task=index, paths=paths)
+                results.append(paths)
+                st.update(stats)
+                done["tasks"] += 1
+                done["recovered"] += len(paths)
+                if progress:
+                    progress(tasks_done=done["tasks"], total_tasks=len(tasks), recovered=done["recovered"])
+
+            pool_map(_recover_task, [task for _, task in todo], min(num_workers, max(1, len(todo))), on_result)
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
+        if temp_store:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(temp_store + suffix):
+                    os.remove(temp_store + suffix)
+    if checkpoint is not None:
+        checkpoint.discard()
+
+    return sorted(path for paths in results for path in paths)
+
+def recover_docx_from_fragment(fragment_path, output_dir=OUTPUT_DIR):
+    return list(iter_recover_docx(fragment_path, output_dir, max_docs=MAX_DOCX_TOTAL))
+
+def recover_docx_from_manifest(manifest_path, output_dir=OUTPUT_DIR):
+    """
+    Recover .docx files from the dump ranges listed in a slot_scanner manifest.
+    The dump is mapped read-only and never copied into fragment files.
+    """
+    return list(iter_recover_docx(manifest_path, output_dir, max_docs=MAX_DOCX_TOTAL))
@@ -1,79 +1,321 @@
 import os
+import json
 import math
-import multiprocessing
-from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import mmap
+import numpy as np
+from utils import SIGNATURES, pool_map, worker_count
+from docx_format import zip_extents
+from instrumentation import stage, emit
+from checkpoint import Checkpoint, checkpoint_path
 
-DOCX_SIGNATURE = b'PK\x03\x04'
 OUTPUT_FOLDER = "fragments"
-FRAGMENT_SIZE = 20 * 1024 * 1024  # 20 MB per fragment
+INDEX_FILE = os.path.join(OUTPUT_FOLDER, "signature_index.npz")
+MANIFEST_FILE = os.path.join(OUTPUT_FOLDER, "manifest.json")
+FRAGMENT_SIZE = 20 * 1024 * 1024  # 20 MB per fragment ("window" carve mode)
+CARVE_MODE = "exact"  # "exact": one copy per ZIP archive at its real length; "window": FRAGMENT_SIZE per signature
+SCAN_RANGE_SIZE = 256 * 1024 * 1024  # 256 MB of dump per scan task
+SCAN_WINDOW_SIZE = 4 * 1024 * 1024  # 4 MB, kept cache-hot while every signature is searched
+READ_SIZE = 1024 * 1024  # 1 MB, unit of the "scanned slots" statistic
 
 def _extract_and_write(args):
     """
-    Worker function: open the dump and write all fragments for a chunk of offsets.
+    Worker function: open the dump and write all fragments for a chunk of (offset, length) ranges.
+    With resume set, fragments already complete in an existing part file are
+    kept and writing continues after the last complete one; the caller only
+    sets it for parts its checkpoint journal says this run started.
     """
-    dump_path, offsets, part_idx = args
-    os.makedirs(OUTPUT_FOLDER, exist_ok=True)
-    output_file = os.path.join(OUTPUT_FOLDER, f"fragment_part{part_idx+1}.bin")
-    with open(dump_path, "rb") as f, open(output_file, "wb") as out:
-        for offset in offsets:
+    dump_path, ranges, part_idx, output_folder, resume = args
+    os.makedirs(output_folder, exist_ok=True)
+    output_file = os.path.join(output_folder, f"fragment_part{part_idx+1}.bin")
+    done, kept = 0, 0
+    if resume and os.path.exists(output_file):
+        existing = os.path.getsize(output_file)
+        dump_size = os.path.getsize(dump_path)
+        for offset, length in ranges:
+            length = min(length, dump_size - offset)  # window-mode fragments stop at the dump end
+            if kept + length > existing:
+                break
+            kept += length
+            done += 1
+    with open(dump_path, "rb") as f, open(output_file, "r+b" if kept else "wb") as out:
+        out.truncate(kept)
+        out.seek(kept)
+        for offset, length in ranges[done:]:
             f.seek(offset)
-            chunk = f.read(FRAGMENT_SIZE)
+            chunk = f.read(length)
             out.write(chunk)
-    return len(offsets)
-
-def scan_and_create_accurate_fragment(dump_path):
-    os.makedirs(OUTPUT_FOLDER, exist_ok=True)
-    signature_offsets = []
-    read_size = 1024 * 1024  # 1 MB
-    total_bytes_read = 0
-
-    # --- Phase 1: scan for DOCX signatures ---
-    with open(dump_path, "rb") as f:
-        while True:
-            block = f.read(read_size)
-            if not block:
-                break
-            offset_in_block = 0
-            while True:
-                idx = block.find(DOCX_SIGNATURE, offset_in_block)
-                if idx == -1:
-                    break
-                signature_offsets.append(total_bytes_read + idx)
-                offset_in_block = idx + len(DOCX_SIGNATURE)
-            total_bytes_read += len(block)
-
-    count = len(signature_offsets)
-    print(f"[✓] Found {count} DOCX signatures.")
+        # the part is journalled as finished next, so it must really be on disk
+        out.flush()
+        os.fsync(out.fileno())
+    return len(ranges)
+
+def _scan_range(args):
+    """
+    Worker function: find every registered signature that starts inside [start, end).
+    The range is walked once in small windows; all signatures are searched in a
+    window while it is still in cache, so the dump is read a single time. Each
+    window is searched a few bytes past its end so that hits straddling a
+    boundary are still found exactly once.
+    """
+    dump_path, start, end, signatures = args
+    overlap = max(len(sig) for sig in signatures.values()) - 1
+    found = {name: [] for name in signatures}
+    with open(dump_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for window_start in range(start, end, SCAN_WINDOW_SIZE):
+            window_end = min(window_start + SCAN_WINDOW_SIZE, end)
+            search_end = min(len(mm), window_end + overlap)
+            for name, signature in signatures.items():
+                offsets = found[name]
+                idx = mm.find(signature, window_start, search_end)
+                while idx != -1 and idx < window_end:
+                    offsets.append(idx)
+                    idx = mm.find(signature, idx + len(signature), search_end)
+    return {name: np.array(offsets, dtype=np.uint64) for name, offsets in found.items()}
+
+def scan_signatures(dump_path, signatures=SIGNATURES, num_workers=None, progress=None, checkpoint=None):
+    """
+    Single-pass scan of the whole dump for all `signatures`, in parallel over mmap.
+    Returns a dict of sorted uint64 offset arrays keyed by signature name, and the dump size.
+    `progress`, if given, is called with bytes_scanned/total_bytes/candidates
+    after each scan range completes.
+    With a Checkpoint, each finished range's offsets are saved to it and
+    ranges it already holds are not scanned again.
+    """
+    dump_size = os.path.getsize(dump_path)
+    if dump_size == 0:
+        return {name: np.empty(0, dtype=np.uint64) for name in signatures}, 0
+
+    tasks = [
+        (dump_path, start, min(start + SCAN_RANGE_SIZE, dump_size), signatures)
+        for start in range(0, dump_size, SCAN_RANGE_SIZE)
+    ]
+    found_by_start = {}
+    if checkpoint is not None:
+        for record in checkpoint.items("range"):
+            found_by_start[record["start"]] = checkpoint.load_arrays(f"range_{record['start']}")
+    todo = [task for task in tasks if task[1] not in found_by_start]
+    num_workers = min(num_workers or worker_count(), max(1, len(todo)))
+
+    done = {
+        "bytes": sum(min(SCAN_RANGE_SIZE, dump_size - start) for start in found_by_start),
+        "candidates": sum(len(offsets) for found in found_by_start.values() for offsets in found.values()),
+    }
+    pending = iter(todo)
+
+    with stage("scan", dump=os.path.basename(dump_path), workers=num_workers) as st:
+        def on_result(found):
+            _, start, end, _ = next(pending)  # results arrive in task order
+            if checkpoint is not None:
+                checkpoint.save_arrays(f"range_{start}", **found)
+                checkpoint.record("range", start=start)
+            found_by_start[start] = found
+            done["bytes"] += end - start
+            done["candidates"] += sum(len(offsets) for offsets in found.values())
+            st.add_bytes(end - start)
+            if progress:
+                progress(bytes_scanned=done["bytes"], total_bytes=dump_size,
+                         candidates=done["candidates"])
+
+        pool_map(_scan_range, todo, num_workers, on_result)
+
+        # ranges are disjoint and ordered, so concatenation keeps offsets sorted
+        index = {
+            name: np.concatenate([found_by_start[task[1]][name] for task in tasks])
+            for name in signatures
+        }
+        for name, offsets in index.items():
+            st.count(name, len(offsets))
+    return index, dump_size
+
+def write_signature_index(index, dump_path, index_path=INDEX_FILE):
+    """
+    Save the offset arrays as a compressed .npz, stamped with the dump size and
+    mtime so that a stale index is never reused for a different dump.
+    """
+    os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+    stat = os.stat(dump_path)
+    np.savez_compressed(
+        index_path,
+        _dump_size=np.uint64(stat.st_size),
+        _dump_mtime_ns=np.uint64(stat.st_mtime_ns),
+        **index
+    )
+
+def load_signature_index(index_path=INDEX_FILE, dump_path=None):
+    """
+    Load an index written by write_signature_index.
+    Returns None if the file is missing or was built from a different dump.
+    """
+    if not os.path.exists(index_path):
+        return None
+    with np.load(index_path) as z:
+        if dump_path is not None:
+            stat = os.stat(dump_path)
+            if (int(z["_dump_size"]) != stat.st_size
+                    or int(z["_dump_mtime_ns"]) != stat.st_mtime_ns):
+                return None
+        return {name: z[name] for name in z.files if not name.startswith("_")}
+
+def build_signature_index(dump_path, index_path=INDEX_FILE, signatures=SIGNATURES, progress=None, num_workers=None,
+                          resume=True):
+    """
+    Return the signature index for `dump_path`, scanning the dump only if no
+    up-to-date index exists at `index_path`.
+    With resume set, an interrupted scan continues from the checkpoint kept
+    next to the index; the checkpoint is removed once the index is written.
+    """
+    index = load_signature_index(index_path, dump_path)
+    if index is not None and all(name in index for name in signatures):
+        print(f"[✓] Reusing signature index '{index_path}'.")
+        emit("index_reused", stage="scan", index=index_path)
+        return index
+    if not resume:
+        index, _ = scan_signatures(dump_path, signatures, num_workers, progress)
+        write_signature_index(index, dump_path, index_path)
+        return index
 
+    checkpoint = Checkpoint(
+        checkpoint_path("scan", [dump_path], os.path.dirname(index_path) or "."),
+        [dump_path],
+        {"range_size": SCAN_RANGE_SIZE, "signatures": {name: sig.hex() for name, sig in signatures.items()}},
+    )
+    with checkpoint:
+        index, _ = scan_signatures(dump_path, signatures, num_workers, progress, checkpoint)
+    write_signature_index(index, dump_path, index_path)
+    checkpoint.discard()
+    return index
+
+def docx_archive_ranges(dump_path, index):
+    """
+    Pair every EOCD in the index with its first local header and return the
+    (offset, length) of each complete archive in the dump. Interior local
+    headers fall inside an archive and are not carved separately.
+    """
+    if len(index["docx_end"]) == 0:
+        return []
+    with stage("match_archives", dump=os.path.basename(dump_path)) as st, \
+            open(dump_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        extents = zip_extents(mm, index["docx_end"])
+        st.count("eocd", len(index["docx_end"]))
+        st.accept(len(extents))
+        st.reject("unmatched_eocd", len(index["docx_end"]) - len(extents))
+    return [(start, end - start) for start, end in extents]
+
+def write_manifest(dump_path, fragment_ranges, manifest_path=MANIFEST_FILE):
+    """
+    Record fragments as (offset, length) ranges of the original dump instead
+    of copying their bytes. Recovery reads the ranges straight from the dump.
+    """
+    dump_size = os.path.getsize(dump_path)
+    manifest = {
+        "dump_path": os.path.abspath(dump_path),
+        "dump_size": dump_size,
+        "ranges": [
+            [offset, min(length, dump_size - offset)]
+            for offset, length in fragment_ranges
+        ],
+    }
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    return manifest_path
+
+def scan_and_create_accurate_fragment(dump_path, carve_mode=CARVE_MODE, manifest_only=False, progress=None,
+                                      output_folder=OUTPUT_FOLDER, num_workers=None, resume=True):
+    """
+    Scan the dump and carve DOCX fragments into `output_folder`, which also
+    holds the signature index.
+    With manifest_only=True no bytes are copied; a manifest of dump ranges
+    is written to manifest.json in `output_folder` instead.
+    `progress` receives scan counters and then fragments_written/total_fragments.
+    With resume set (the default), an interrupted run picks up the scan and
+    the fragment extraction where they stopped.
+    """
+    os.makedirs(output_folder, exist_ok=True)
+    index_path = os.path.join(output_folder, os.path.basename(INDEX_FILE))
+    manifest_path = os.path.join(output_folder, os.path.basename(MANIFEST_FILE))
+
+    # --- Phase 1: parallel single-pass scan for all registered signatures ---
+    index = build_signature_index(dump_path, index_path, progress=progress, num_workers=num_workers, resume=resume)
+    dump_size = os.path.getsize(dump_path)
+    print(f"[✓] Found {len(index['docx_start'])} DOCX signatures.")
+
+    if carve_mode == "exact":
+        fragment_ranges = docx_archive_ranges(dump_path, index)
+        print(f"[✓] Matched {len(fragment_ranges)} complete DOCX archives.")
+    else:
+        fragment_ranges = [(offset, FRAGMENT_SIZE) for offset in index["docx_start"].tolist()]
+
+    count = len(fragment_ranges)
     if count == 0:
-        print("[!] No DOCX signatures found.")
-        return 0, total_bytes_read // read_size
+        print("[!] No DOCX fragments found.")
+        return 0, dump_size // READ_SIZE
+
+    if manifest_only:
+        write_manifest(dump_path, fragment_ranges, manifest_path)
+        print(f"[✓] Wrote manifest of {count} fragments to '{manifest_path}'.")
+        return count, dump_size // READ_SIZE
 
     # --- Phase 2: parallel extraction ---
-    cpu_count = multiprocessing.cpu_count()
-    # limit to 70% of available cores, at least 1
-    num_workers = max(1, int(cpu_count * 0.7))
+    num_workers = num_workers or worker_count()
     # determine chunk size per worker
     chunk_size = math.ceil(count / num_workers)
-    # split offsets into chunks
+    # split ranges into chunks
     offset_chunks = [
-        signature_offsets[i:i + chunk_size]
+        fragment_ranges[i:i + chunk_size]
         for i in range(0, count, chunk_size)
     ]
 
     print(f"[✓] Extracting fragments using {len(offset_chunks)} workers...")
 
+    # started and finished parts are journalled; a part this run started and
+    # did not finish is completed in place, any other part file is rewritten
+    checkpoint = None
+    parts_done = {}
+    parts_started = set()
+    if resume:
+        checkpoint = Checkpoint(
+            checkpoint_path("extract", [dump_path], output_folder), [dump_path],
+            {"ranges": hashlib.sha1(json.dumps(fragment_ranges).encode("ascii")).hexdigest(),
+             "parts": len(offset_chunks)},
+        )
+        if checkpoint.resumed:
+            parts_done = {r["part"]: r["fragments"] for r in checkpoint.items("part")}
+            parts_started = {r["part"] for r in checkpoint.items("part_started")}
+
     # prepare arguments for each worker
     tasks = [
-        (dump_path, chunk, idx)
+        (dump_path, chunk, idx, output_folder, idx in parts_started)
         for idx, chunk in enumerate(offset_chunks)
+        if idx not in parts_done
     ]
+    if checkpoint is not None:
+        for task in tasks:
+            if task[2] not in parts_started:
+                checkpoint.record("part_started", part=task[2])
+    pending = iter(tasks)
 
     # run workers
-    with ProcessPoolExecutor(max_workers=len(offset_chunks)) as executor:
-        results = executor.map(_extract_and_write, tasks)
+    written = [sum(parts_done.values())]
+    try:
+        with stage("extract", dump=os.path.basename(dump_path), workers=len(offset_chunks)) as st:
+            def on_result(n):
+                part = next(pending)[2]  # results arrive in task order
+                if checkpoint is not None:
+                    checkpoint.record("part", part=part, fragments=n)
+                written[0] += n
+                if progress:
+                    progress(fragments_written=written[0], total_fragments=count)
 
-    total_fragments = sum(results)
-    print(f"[✓] Extracted {total_fragments} fragments into '{OUTPUT_FOLDER}'.")
-    return count, total_bytes_read // read_size
+            total_fragments = sum(pool_map(_extract_and_write, tasks, max(1, len(tasks)), on_result))
+            total_fragments += sum(parts_done.values())
+            st.add_bytes(sum(min(length, dump_size - offset) for task in tasks for offset, length in task[1]))
+            st.count("fragments", total_fragments)
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
+    if checkpoint is not None:
+        checkpoint.discard()
+    print(f"[✓] Extracted {total_fragments} fragments into '{output_folder}'.")
+    return count, dump_size // READ_SIZE
 
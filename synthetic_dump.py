@@ -0,0 +1,296 @@
+# synthetic_dump.py — reproducible synthetic disk dumps with known ground truth
+#
+# Builds a raw image of a given size holding real .docx and .doc files,
+# encrypted OOXML containers, truncated and fragmented archives, random
+# high-entropy blobs and stray PK\x03\x04 bytes, each at a recorded offset.
+# The ground truth is written next to the dump as <dump>.truth.json so that
+# bench_carving.py can score scan and recovery results against it.
+
+import io
+import os
+import sys
+import json
+import math
+import random
+import struct
+import hashlib
+import zipfile
+import numpy as np
+from utils import DOCX_SIG
+
+DEFAULT_SIZE = 64 * 1024 * 1024  # 64 MB
+SECTOR = 512  # files start on sector boundaries, as on a real file system
+ZIP_DATE = (2020, 1, 1, 0, 0, 0)  # fixed timestamps keep archives byte-identical per seed
+
+# items per 64 MB of dump; scaled with the requested size
+DEFAULT_MIX = {
+    "docx": 40,
+    "docx_large": 4,        # over 800 KB, past the old fixed recovery window
+    "docx_duplicate": 4,    # byte-identical copy of an earlier .docx
+    "doc": 10,
+    "encrypted_ooxml": 5,
+    "truncated_docx": 5,
+    "fragmented_docx": 5,
+    "random_blob": 20,
+    "stray_pk": 200,
+}
+
+WORDS = ("evidence", "invoice", "contract", "meeting", "report", "budget", "password",
+         "account", "transfer", "schedule", "project", "memo", "confidential", "draft",
+         "signature", "client", "payment", "review", "summary", "quarter")
+
+# === Document builders ===
+def _text(rng, index, n_words):
+    # the index keeps every document's text unique, so text dedup never merges two
+    return f"Document {index}: " + " ".join(rng.choice(WORDS) for _ in range(n_words))
+
+def make_docx(text, media_sizes=(), seed=0):
+    """Minimal but well-formed .docx with `text` and random (incompressible) media parts."""
+    np_rng = np.random.default_rng(seed)
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        def add(name, data, compress_type=zipfile.ZIP_DEFLATED):
+            info = zipfile.ZipInfo(name, ZIP_DATE)
+            info.compress_type = compress_type
+            zf.writestr(info, data)
+
+        add("[Content_Types].xml",
+            '<?xml version="1.0" encoding="UTF-8"?><Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="xml" ContentType="application/xml"/></Types>')
+        add("_rels/.rels",
+            '<?xml version="1.0" encoding="UTF-8"?><Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="word/document.xml"/></Relationships>')
+        paragraphs = "".join(
+            f"<w:p><w:r><w:t>{chunk}</w:t></w:r></w:p>"
+            for chunk in (text[i:i + 200] for i in range(0, len(text), 200))
+        )
+        add("word/document.xml",
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+            f"<w:body>{paragraphs}</w:body></w:document>")
+        for i, size in enumerate(media_sizes, start=1):
+            add(f"word/media/image{i}.png", np_rng.bytes(size), zipfile.ZIP_STORED)
+    return buf.getvalue()
+
+def make_ole(streams):
+    """
+    Minimal OLE compound file (version 3, 512-byte sectors) holding up to three
+    root-level streams. Streams are padded to the 4096-byte mini-stream cutoff
+    so no mini FAT is needed; the whole file must fit one FAT sector (64 KB).
+    """
+    FREE, END, FAT_SECT, NO_STREAM = 0xFFFFFFFF, 0xFFFFFFFE, 0xFFFFFFFD, 0xFFFFFFFF
+    # directory siblings are ordered by name length, then upper-cased name
+    streams = sorted(((name, data.ljust(4096, b"\0")) for name, data in streams),
+                     key=lambda s: (len(s[0]), s[0].upper()))
+    if len(streams) > 3:
+        raise ValueError("At most three streams fit one directory sector")
+
+    fat = [FREE] * 128
+    fat[0], fat[1] = FAT_SECT, END  # sector 0: FAT, sector 1: directory
+    next_sector = 2
+    starts = []
+    for _, data in streams:
+        n = math.ceil(len(data) / SECTOR)
+        starts.append(next_sector)
+        for s in range(next_sector, next_sector + n - 1):
+            fat[s] = s + 1
+        fat[next_sector + n - 1] = END
+        next_sector += n
+    if next_sector > len(fat):
+        raise ValueError("Streams too large for a single FAT sector")
+
+    header = struct.pack(
+        "<8s16sHHHHH6sIIIIIIIII",
+        bytes.fromhex("D0CF11E0A1B11AE1"), b"\0" * 16, 0x3E, 3, 0xFFFE, 9, 6, b"\0" * 6,
+        0, 1, 1, 0, 4096, END, 0, END, 0,
+    ) + struct.pack("<109I", 0, *([FREE] * 108))
+
+    def entry(name, kind, right, child, start, size):
+        encoded = (name + "\0").encode("utf-16-le") if name else b""
+        return struct.pack("<64sHBBIII16sIQQIQ", encoded, len(encoded), kind, 1,
+                           NO_STREAM, right, child, b"\0" * 16, 0, 0, 0, start, size)
+
+    entries = [entry("Root Entry", 5, NO_STREAM, 1 if streams else NO_STREAM, END, 0)]
+    for i, ((name, data), start) in enumerate(zip(streams, starts), start=1):
+        entries.append(entry(name, 2, i + 1 if i < len(streams) else NO_STREAM, NO_STREAM, start, len(data)))
+    while len(entries) < SECTOR // 128:
+        entries.append(entry("", 0, NO_STREAM, NO_STREAM, 0, 0))
+    directory = b"".join(entries)
+
+    body = b"".join(data.ljust(math.ceil(len(data) / SECTOR) * SECTOR, b"\0") for _, data in streams)
+    return header + struct.pack("<128I", *fat) + directory + body
+
+def make_doc(text):
+    """Legacy .doc stand-in: an OLE file with WordDocument and 1Table streams."""
+    return make_ole([("WordDocument", text.encode("utf-16-le")), ("1Table", b"\0" * 4096)])
+
+def make_encrypted_ooxml(seed=0):
+    """Password-protected OOXML as Office writes it: an OLE file with an encrypted package."""
+    np_rng = np.random.default_rng(seed)
+    return make_ole([("EncryptionInfo", np_rng.bytes(1024)), ("EncryptedPackage", np_rng.bytes(32 * 1024))])
+
+# === Dump layout ===
+def _build_specs(rng, size, mix):
+    """
+    Decide what goes into the dump. Specs only hold the parameters of each
+    item; _materialize rebuilds its bytes on demand, so memory use does not
+    grow with the dump size.
+    """
+    scale = size / DEFAULT_SIZE
+    specs = []
+    docx_specs = []
+
+    def count(kind):
+        return max(0, round(mix.get(kind, 0) * scale))
+
+    def add(kind, **params):
+        spec = {"kind": kind, "id": len(specs) + 1, **params}
+        specs.append(spec)
+        return spec
+
+    for _ in range(count("docx")):
+        media = [rng.randint(1024, 64 * 1024)] if rng.random() < 0.4 else []
+        docx_specs.append(add("docx", words=rng.randint(20, 400), media=media))
+    for _ in range(count("docx_large")):
+        docx_specs.append(add("docx", words=100, media=[rng.randint(900 * 1024, 2 * 1024 * 1024)]))
+    for _ in range(min(count("docx_duplicate"), len(docx_specs))):
+        original = rng.choice(docx_specs)
+        add("docx_duplicate", words=original["words"], media=original["media"], source=original["id"])
+    for _ in range(count("doc")):
+        add("doc", words=rng.randint(50, 300))
+    for _ in range(count("encrypted_ooxml")):
+        add("encrypted_ooxml")
+    for _ in range(count("truncated_docx")):
+        add("truncated_docx", words=200, media=[rng.randint(8 * 1024, 64 * 1024)], keep=rng.uniform(0.25, 0.5))
+    for _ in range(count("fragmented_docx")):
+        add("fragmented_docx", words=200, media=[rng.randint(16 * 1024, 64 * 1024)], cut=rng.uniform(0.25, 0.75))
+    for _ in range(count("random_blob")):
+        add("random_blob", length=rng.randint(64 * 1024, 1024 * 1024))
+    rng.shuffle(specs)
+    return specs
+
+def _materialize(spec):
+    """Return (data, tail) for a spec; tail is the detached second half of a fragmented archive."""
+    kind = spec["kind"]
+    # every item draws from its own seeded generator, so rebuilding it gives the same bytes
+    text_id = spec.get("source", spec["id"])
+    rng = random.Random(text_id)
+    if kind in ("docx", "docx_duplicate", "truncated_docx", "fragmented_docx"):
+        data = make_docx(_text(rng, text_id, spec["words"]), spec["media"], seed=text_id)
+        if kind == "truncated_docx":
+            # cut before the central directory: no EOCD, not recoverable
+            return data[:int(len(data) * spec["keep"])], b""
+        if kind == "fragmented_docx":
+            cut = int(len(data) * spec["cut"])
+            return data[:cut], data[cut:]
+        return data, b""
+    if kind == "doc":
+        return make_doc(_text(rng, text_id, spec["words"])), b""
+    if kind == "encrypted_ooxml":
+        return make_encrypted_ooxml(seed=text_id), b""
+    return np.random.default_rng(text_id).bytes(spec["length"]), b""
+
+def _filler(rng, n):
+    # mostly zeroed sectors with some short ASCII runs, like slack space
+    out = bytearray(n)
+    for _ in range(n // (64 * 1024)):
+        pos = rng.randrange(0, max(1, n - 64))
+        line = f"{rng.choice(WORDS)} {rng.randint(0, 99999)};".encode("ascii")
+        out[pos:pos + len(line)] = line[:n - pos]
+    return bytes(out)
+
+def generate_dump(dump_path, size=DEFAULT_SIZE, seed=0, mix=None):
+    """
+    Write a synthetic dump of exactly `size` bytes to `dump_path` and its
+    ground truth to `<dump_path>.truth.json`. The same seed always gives the
+    same dump. Returns the ground truth dict.
+    """
+    rng = random.Random(seed)
+    mix = dict(DEFAULT_MIX, **(mix or {}))
+    specs = _build_specs(rng, size, mix)
+
+    # first pass only measures the items, to spread the free space between them
+    lengths = [sum(map(len, _materialize(spec))) for spec in specs]
+    needed = sum(lengths) + 2 * SECTOR * len(specs)
+    if needed > size:
+        raise ValueError(f"Dump size {size} too small for {needed} bytes of items; raise size or reduce mix")
+    cuts = sorted(rng.randrange(0, size - needed + 1) for _ in specs)
+    gaps = [b - a for a, b in zip([0] + cuts[:-1], cuts)]
+
+    truth = {"dump_path": os.path.abspath(dump_path), "size": size, "seed": seed, "mix": mix, "items": []}
+    pending_tails = []
+    pos = 0
+    with open(dump_path, "wb") as out:
+        def pad_to(target):
+            nonlocal pos
+            while pos < target:
+                n = min(target - pos, 8 * 1024 * 1024)
+                out.write(_filler(rng, n))
+                pos += n
+
+        def write_tail(record, tail):
+            nonlocal pos
+            pad_to(math.ceil(pos / SECTOR) * SECTOR)
+            record["tail_offset"], record["tail_length"] = pos, len(tail)
+            out.write(tail)
+            pos += len(tail)
+
+        for spec, gap in zip(specs, gaps):
+            pad_to(pos + gap)
+            # the tail of a fragmented archive lands in a later gap, like a non-contiguous file
+            if pending_tails and rng.random() < 0.5:
+                write_tail(*pending_tails.pop(0))
+            pad_to(math.ceil(pos / SECTOR) * SECTOR)
+
+            data, tail = _materialize(spec)
+            record = {"kind": spec["kind"], "offset": pos, "length": len(data),
+                      "sha1": hashlib.sha1(data).hexdigest()}
+            if spec["kind"] in ("docx", "docx_duplicate"):
+                record["text_id"] = spec.get("source", spec["id"])
+            out.write(data)
+            pos += len(data)
+            if tail:
+                pending_tails.append((record, tail))
+            truth["items"].append(record)
+
+        for record, tail in pending_tails:
+            write_tail(record, tail)
+        pad_to(size)
+
+    # stray local-header signatures in filler, never inside an item
+    occupied = [(r["offset"], r["offset"] + r["length"]) for r in truth["items"]]
+    occupied += [(r["tail_offset"], r["tail_offset"] + r["tail_length"]) for r in truth["items"] if "tail_offset" in r]
+    strays = []
+    with open(dump_path, "r+b") as out:
+        for _ in range(round(mix.get("stray_pk", 0) * size / DEFAULT_SIZE)):
+            offset = rng.randrange(0, size - 64)
+            if any(start - 64 < offset < end for start, end in occupied):
+                continue
+            out.seek(offset)
+            out.write(DOCX_SIG + bytes(rng.randrange(256) for _ in range(26)))
+            strays.append(offset)
+            occupied.append((offset, offset + 30))
+    truth["items"].extend({"kind": "stray_pk", "offset": o, "length": 30} for o in strays)
+    truth["items"].sort(key=lambda r: r["offset"])
+
+    with open(truth_path(dump_path), "w", encoding="utf-8") as f:
+        json.dump(truth, f, indent=1)
+    return truth
+
+def truth_path(dump_path):
+    return dump_path + ".truth.json"
+
+def load_truth(dump_path):
+    with open(truth_path(dump_path), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+if __name__ == "__main__":
+    # python synthetic_dump.py <dump path> [size in MB] [seed]
+    path = sys.argv[1] if len(sys.argv) > 1 else "synthetic.bin"
+    size_mb = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_SIZE // (1024 * 1024)
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    truth = generate_dump(path, size_mb * 1024 * 1024, seed)
+    kinds = {}
+    for item in truth["items"]:
+        kinds[item["kind"]] = kinds.get(item["kind"], 0) + 1
+    print(f"[✓] Wrote {size_mb} MB synthetic dump '{path}': {kinds}")
@@ -1,4 +1,7 @@
 #UTILS — utils.py
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
 # Minimum size to consider a valid .docx file
 MIN_DOCX_SIZE = 4096
 
@@ -13,3 +16,39 @@ DOC_SIG = b'\xD0\xCF\x11\xE0\xA1\xB1\x1A\xE1'
 
 # Max chunk size when reading binary blob
 BLOCK_SIZE = 8 * 1024 * 1024  # 8 MB
+
+# Signatures recorded by the carving index (slot_scanner), keyed by index name
+SIGNATURES = {
+    "docx_start": DOCX_SIG,
+    "docx_end": DOCX_END,
+    "doc": DOC_SIG,
+}
+
+def worker_count():
+    """Default number of worker processes: 70% of the available cores, at least 1."""
+    return max(1, int(multiprocessing.cpu_count() * 0.7))
+
+def pool_map(func, tasks, num_workers, on_result=None):
+    """
+    Map func over tasks with a process pool (in-process when num_workers <= 1)
+    and return the results in task order. on_result(result) is called as each
+    result arrives; if it raises (e.g. a cancelled GUI job), tasks that have
+    not started yet are dropped instead of being run to completion.
+    """
+    results = []
+    if num_workers <= 1:
+        for task in tasks:
+            results.append(func(task))
+            if on_result:
+                on_result(results[-1])
+        return results
+
+    executor = ProcessPoolExecutor(max_workers=num_workers)
+    try:
+        for future in [executor.submit(func, task) for task in tasks]:
+            results.append(future.result())
+            if on_result:
+                on_result(results[-1])
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+    return results